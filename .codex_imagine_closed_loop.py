@@ -1,54 +1,145 @@
+import argparse
+import contextlib
+import http.client
 import json
 import os
 import subprocess
 import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
 
 BASE = "http://127.0.0.1:8000"
 PY = os.path.join('.venv', 'Scripts', 'python.exe')
 
+_BASE_PARTS = urllib.parse.urlsplit(BASE)
+
+
+class ConnectionPool:
+    """Keep-alive connections to BASE shared by control calls and SSE streams."""
+
+    def __init__(self, maxsize: int = 8):
+        self._maxsize = maxsize
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _connect(timeout: float) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(_BASE_PARTS.hostname, _BASE_PARTS.port, timeout=timeout)
+
+    def _acquire(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self._maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    @contextlib.contextmanager
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+    ) -> Iterator[http.client.HTTPResponse]:
+        conn, reused = self._acquire(timeout)
+        try:
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+            except ConnectionError:
+                if not reused:
+                    raise
+                # An idle keep-alive socket may have been closed by the server; retry once fresh.
+                conn.close()
+                conn = self._connect(timeout)
+                conn.request(method, path, body=body, headers=headers or {})
+                resp = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        try:
+            yield resp
+        finally:
+            # Only a fully drained, persistent connection can be handed to the next caller.
+            if resp.isclosed() and not resp.will_close:
+                self._release(conn)
+            else:
+                conn.close()
+
 
-def http_get(url: str, timeout: float = 10.0):
-    req = urllib.request.Request(url, method='GET')
-    return urllib.request.urlopen(req, timeout=timeout)
+POOL = ConnectionPool()
 
 
-def http_post_json(url: str, payload: Dict[str, Any], timeout: float = 15.0):
-    data = json.dumps(payload).encode('utf-8')
-    req = urllib.request.Request(url, data=data, method='POST')
-    req.add_header('Content-Type', 'application/json')
-    return urllib.request.urlopen(req, timeout=timeout)
+def http_get(path: str, timeout: float = 10.0):
+    return POOL.request('GET', path, timeout=timeout)
+
+
+def http_post_json(path: str, payload: Dict[str, Any], timeout: float = 15.0):
+    return POOL.request(
+        'POST',
+        path,
+        body=orjson.dumps(payload),
+        headers={'Content-Type': 'application/json'},
+        timeout=timeout,
+    )
 
 
 def wait_server(timeout=25.0):
     t0 = time.time()
+    delay = 0.05
     while time.time() - t0 < timeout:
         try:
-            with http_get(BASE + '/docs', timeout=1.5) as r:
-                if getattr(r, 'status', 200) < 500:
+            with POOL.request('HEAD', '/docs', timeout=1.0) as r:
+                r.read()
+                if r.status < 500:
                     return True
         except Exception:
             pass
-        time.sleep(0.5)
+        time.sleep(delay)
+        delay = min(delay * 1.6, 0.5)
     return False
 
 
-def parse_sse_line(line: str) -> Optional[Dict[str, Any]]:
-    if not line:
-        return None
-    line = line.strip()
-    if not line.startswith('data:'):
+def iter_sse_lines(resp: http.client.HTTPResponse, chunk_size: int = 65536) -> Iterator[bytes]:
+    buf = bytearray()
+    while True:
+        chunk = resp.read1(chunk_size)
+        if not chunk:
+            break
+        buf += chunk
+        start = 0
+        while (nl := buf.find(b'\n', start)) != -1:
+            yield bytes(buf[start:nl])
+            start = nl + 1
+        del buf[:start]
+    if buf:
+        yield bytes(buf)
+
+
+def parse_sse_line(line: bytes) -> Optional[Dict[str, Any]]:
+    if line[:5] != b'data:':
         return None
     payload = line[5:].strip()
-    if not payload or payload == '[DONE]':
+    if not payload or payload == b'[DONE]':
         return None
     try:
-        data = json.loads(payload)
-    except Exception:
+        data = orjson.loads(payload)
+    except orjson.JSONDecodeError:
         return None
     return data if isinstance(data, dict) else None
 
@@ -61,20 +152,17 @@ def start_task(prompt: str, quantity: int, concurrent: int, errors: List[str]) -
         'concurrent': concurrent,
     }
     try:
-        with http_post_json(BASE + '/v1/public/imagine/start', body, timeout=15) as r:
-            raw = r.read().decode('utf-8', errors='ignore')
-            if getattr(r, 'status', 200) != 200:
-                errors.append(f'start_http_{getattr(r, "status", "unknown")}:{raw[:300]}')
+        with http_post_json('/v1/public/imagine/start', body, timeout=15) as r:
+            raw = r.read()
+            if r.status != 200:
+                errors.append(f'start_http_{r.status}:{raw.decode("utf-8", errors="ignore")[:300]}')
                 return None
-            j = json.loads(raw)
+            j = orjson.loads(raw)
             tid = j.get('task_id')
             if not tid:
                 errors.append('start_no_task_id')
                 return None
             return tid
-    except urllib.error.HTTPError as e:
-        body = e.read().decode('utf-8', errors='ignore') if hasattr(e, 'read') else ''
-        errors.append(f'start_http_{e.code}:{body[:300]}')
     except Exception as e:
         errors.append(f'start_exc:{type(e).__name__}:{e}')
     return None
@@ -82,13 +170,10 @@ def start_task(prompt: str, quantity: int, concurrent: int, errors: List[str]) -
 
 def stop_task(task_id: str, errors: List[str]) -> None:
     try:
-        with http_post_json(BASE + '/v1/public/imagine/stop', {'task_ids': [task_id]}, timeout=15) as r:
-            _ = r.read()
-            if getattr(r, 'status', 200) != 200:
-                errors.append(f'stop_http_{getattr(r, "status", "unknown")}')
-    except urllib.error.HTTPError as e:
-        body = e.read().decode('utf-8', errors='ignore') if hasattr(e, 'read') else ''
-        errors.append(f'stop_http_{e.code}:{body[:300]}')
+        with http_post_json('/v1/public/imagine/stop', {'task_ids': [task_id]}, timeout=15) as r:
+            raw = r.read()
+            if r.status != 200:
+                errors.append(f'stop_http_{r.status}:{raw.decode("utf-8", errors="ignore")[:300]}')
     except Exception as e:
         errors.append(f'stop_exc:{type(e).__name__}:{e}')
 
@@ -96,6 +181,7 @@ def stop_task(task_id: str, errors: List[str]) -> None:
 def run_case(name: str, quantity: int, concurrent: int, stop_mode: str) -> Dict[str, Any]:
     t0 = time.time()
     errors: List[str] = []
+    had_timeout = False
     request_ns: List[int] = []
     reason: Optional[str] = None
     generated_count: Optional[int] = None
@@ -114,54 +200,48 @@ def run_case(name: str, quantity: int, concurrent: int, stop_mode: str) -> Dict[
             'errors': errors,
         }
 
+    stop_lock = threading.Lock()
     stop_sent = False
-    first_signal_received = False
 
-    def delayed_stop():
+    def send_stop() -> None:
         nonlocal stop_sent
-        time.sleep(5)
-        stop_task(task_id, errors)
-        stop_sent = True
+        with stop_lock:
+            if stop_sent:
+                return
+            stop_sent = True
+            stop_task(task_id, errors)
 
+    stop_timer = None
     if stop_mode == 'manual_after_5s':
-        threading.Thread(target=delayed_stop, daemon=True).start()
+        stop_timer = threading.Timer(5, send_stop)
+        stop_timer.daemon = True
+        stop_timer.start()
 
-    sse_url = BASE + '/v1/public/imagine/sse?' + urllib.parse.urlencode({'task_id': task_id})
+    sse_path = f"/v1/public/imagine/sse?task_id={urllib.parse.quote(task_id, safe='')}"
 
     try:
-        with http_get(sse_url, timeout=120) as resp:
-            if getattr(resp, 'status', 200) != 200:
+        with http_get(sse_path, timeout=120) as resp:
+            if resp.status != 200:
                 raw = resp.read().decode('utf-8', errors='ignore')
-                errors.append(f'sse_http_{getattr(resp, "status", "unknown")}:{raw[:300]}')
+                errors.append(f'sse_http_{resp.status}:{raw[:300]}')
             else:
-                while True:
-                    line = resp.readline()
-                    if not line:
-                        break
-                    try:
-                        text = line.decode('utf-8', errors='ignore')
-                    except Exception:
-                        continue
-                    data = parse_sse_line(text)
+                for line in iter_sse_lines(resp):
+                    data = parse_sse_line(line)
                     if not data:
                         continue
 
                     t = data.get('type')
                     if t in ('image', 'image_generation.completed'):
                         image_events += 1
-                        if stop_mode == 'infinite_stop_on_first' and not stop_sent:
-                            stop_task(task_id, errors)
-                            stop_sent = True
-                            first_signal_received = True
+                        if stop_mode == 'infinite_stop_on_first':
+                            send_stop()
 
                     if data.get('status') == 'round_done':
                         rn = data.get('request_n')
                         if isinstance(rn, int):
                             request_ns.append(rn)
-                        if stop_mode == 'infinite_stop_on_first' and not stop_sent:
-                            stop_task(task_id, errors)
-                            stop_sent = True
-                            first_signal_received = True
+                        if stop_mode == 'infinite_stop_on_first':
+                            send_stop()
 
                     if data.get('status') == 'stopped':
                         reason = data.get('reason')
@@ -170,15 +250,21 @@ def run_case(name: str, quantity: int, concurrent: int, stop_mode: str) -> Dict[
                         break
     except TimeoutError:
         errors.append('case_timeout_120s')
+        had_timeout = True
     except Exception as e:
         errors.append(f'sse_exc:{type(e).__name__}:{e}')
+    finally:
+        # The stream is over: drop a pending stop, or wait for one already in flight,
+        # so the timer thread never touches this case's errors after we return.
+        if stop_timer is not None:
+            stop_timer.cancel()
+            stop_timer.join()
 
-    if stop_mode == 'infinite_stop_on_first' and not first_signal_received and not stop_sent:
-        stop_task(task_id, errors)
-        stop_sent = True
+    if stop_mode == 'infinite_stop_on_first':
+        send_stop()
 
     elapsed = round(time.time() - t0, 3)
-    status = 'ok' if reason is not None and not any('timeout' in x for x in errors) else 'failed'
+    status = 'ok' if reason is not None and not had_timeout else 'failed'
     return {
         'case': name,
         'status': status,
@@ -191,7 +277,7 @@ def run_case(name: str, quantity: int, concurrent: int, stop_mode: str) -> Dict[
     }
 
 
-def main():
+def main(parallel: bool = False):
     results: List[Dict[str, Any]] = []
     proc = None
     try:
@@ -229,10 +315,18 @@ def main():
             print(json.dumps(results, ensure_ascii=False))
             return
 
-        results.append(run_case('3/1', quantity=1, concurrent=3, stop_mode='normal'))
-        results.append(run_case('3/8', quantity=8, concurrent=3, stop_mode='normal'))
-        results.append(run_case('无限', quantity=0, concurrent=3, stop_mode='infinite_stop_on_first'))
-        results.append(run_case('手动停止', quantity=20, concurrent=3, stop_mode='manual_after_5s'))
+        cases = [
+            dict(name='3/1', quantity=1, concurrent=3, stop_mode='normal'),
+            dict(name='3/8', quantity=8, concurrent=3, stop_mode='normal'),
+            dict(name='无限', quantity=0, concurrent=3, stop_mode='infinite_stop_on_first'),
+            dict(name='手动停止', quantity=20, concurrent=3, stop_mode='manual_after_5s'),
+        ]
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(cases)) as executor:
+                futures = [executor.submit(run_case, **case) for case in cases]
+                results.extend(future.result() for future in futures)
+        else:
+            results.extend(run_case(**case) for case in cases)
 
         print(json.dumps(results, ensure_ascii=False))
     finally:
@@ -248,4 +342,6 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--parallel', action='store_true', help='run the cases concurrently')
+    main(parallel=parser.parse_args().parallel)
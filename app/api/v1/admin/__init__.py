@@ -5,8 +5,9 @@ from fastapi import APIRouter
 from app.api.v1.admin.cache import router as cache_router
 from app.api.v1.admin.config import router as config_router
 from app.api.v1.admin.token import router as tokens_router
+from app.core.orjson_response import ORJSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 router.include_router(config_router)
 router.include_router(tokens_router)
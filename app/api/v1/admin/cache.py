@@ -168,8 +168,8 @@ async def cache_stats(request: Request):
         return response
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"cache_stats failed: {e}")
+    except Exception:
+        logger.exception("cache_stats failed")
         raise HTTPException(status_code=500, detail="Failed to fetch cache stats")
 
 
@@ -191,8 +191,8 @@ async def list_local(
         return {"status": "success", **result}
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"list_local failed: {e}")
+    except Exception:
+        logger.exception("list_local failed")
         raise HTTPException(status_code=500, detail="Failed to list local cache")
 
 
@@ -209,8 +209,8 @@ async def clear_local(data: dict):
         return {"status": "success", "result": result}
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"clear_local failed: {e}")
+    except Exception:
+        logger.exception("clear_local failed")
         raise HTTPException(status_code=500, detail="Failed to clear local cache")
 
 
@@ -229,8 +229,8 @@ async def delete_local_item(data: dict):
         return {"status": "success", "result": result}
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"delete_local_item failed: {e}")
+    except Exception:
+        logger.exception("delete_local_item failed")
         raise HTTPException(status_code=500, detail="Failed to delete local cache item")
 
 
@@ -278,8 +278,8 @@ async def clear_online(data: dict):
         return {"status": "error", "error": data.get("error") or res.get("error")}
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"clear_online failed: {e}")
+    except Exception:
+        logger.exception("clear_online failed")
         raise HTTPException(status_code=500, detail="Failed to clear online cache")
 
 
@@ -337,8 +337,8 @@ async def clear_online_async(data: dict):
                 "results": results,
             }
             task.finish(result)
-        except Exception as e:
-            logger.exception(f"clear_online_async failed: {e}")
+        except Exception:
+            logger.exception("clear_online_async failed")
             task.fail_task("Failed to clear online cache")
         finally:
             import asyncio
@@ -445,8 +445,8 @@ async def load_cache_async(data: dict):
                 "online_details": online_details,
             }
             task.finish(result)
-        except Exception as e:
-            logger.exception(f"load_cache_async failed: {e}")
+        except Exception:
+            logger.exception("load_cache_async failed")
             task.fail_task("Failed to load online cache")
         finally:
             import asyncio
@@ -1,10 +1,12 @@
 import os
 import re
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Response
 
 from app.core.auth import verify_app_key
-from app.core.config import config
+from app.core.config import config, config_version
 from app.core.storage import get_storage as resolve_storage, LocalStorage, RedisStorage, SQLStorage
 from app.core.logger import logger
 
@@ -31,13 +33,17 @@ _CFG_CHAR_REPLACEMENTS = str.maketrans(
         "\ufeff": "",
     }
 )
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# (配置版本, 序列化结果)
+_config_snapshot: Optional[tuple[int, bytes]] = None
 
 
 def _sanitize_proxy_text(value, *, remove_all_spaces: bool = False) -> str:
     text = "" if value is None else str(value)
     text = text.translate(_CFG_CHAR_REPLACEMENTS)
     if remove_all_spaces:
-        text = re.sub(r"\s+", "", text)
+        text = _WHITESPACE_RE.sub("", text)
     else:
         text = text.strip()
     return text.encode("latin-1", errors="ignore").decode("latin-1")
@@ -91,7 +97,13 @@ async def admin_verify():
 async def get_config():
     """获取当前配置"""
     # 暴露原始配置字典
-    return config._config
+    global _config_snapshot
+    version = config_version()
+    snapshot = _config_snapshot
+    if snapshot is None or snapshot[0] != version:
+        snapshot = (version, orjson.dumps(config._config))
+        _config_snapshot = snapshot
+    return Response(content=snapshot[1], media_type="application/json")
 
 
 @router.post("/config", dependencies=[Depends(verify_app_key)])
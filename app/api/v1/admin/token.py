@@ -1,21 +1,28 @@
 import asyncio
 import re
 
-import orjson
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
-from app.core.auth import get_app_key, verify_app_key
+from app.core.auth import get_app_key, secure_compare, verify_app_key
 from app.core.config import get_config
 from app.core.batch import create_task, expire_task, get_task
 from app.core.logger import logger
+from app.core.orjson_response import ORJSONResponse
 from app.core.storage import get_storage
 from app.services.grok.batch_services.usage import UsageService
 from app.services.grok.batch_services.nsfw import NSFWService
 from app.services.token.manager import get_token_manager
+from app.services.token.models import TokenInfo
 
 router = APIRouter()
 
+_SSE_PING = b": ping\n\n"
+_TOKEN_ALLOWED_FIELDS = frozenset(TokenInfo.model_fields)
+
+# 事件循环只持有任务的弱引用，后台任务需保留强引用直到结束
+_background_tasks: set[asyncio.Task] = set()
+
 _TOKEN_CHAR_REPLACEMENTS = str.maketrans(
     {
         "\u2010": "-",
@@ -35,6 +42,13 @@ _TOKEN_CHAR_REPLACEMENTS = str.maketrans(
 )
 
 
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
 def _sanitize_token_text(value) -> str:
     token = "" if value is None else str(value)
     token = token.translate(_TOKEN_CHAR_REPLACEMENTS)
@@ -44,24 +58,77 @@ def _sanitize_token_text(value) -> str:
     return token.encode("ascii", errors="ignore").decode("ascii")
 
 
-def _parse_usage_refresh_result(res: dict) -> tuple[bool, str | None, str | None]:
-    """将 run_batch 的单项结果转换为统一结构。"""
-    if not isinstance(res, dict):
-        return False, None, None
-
-    data = res.get("data")
-    if isinstance(data, bool):
-        return bool(res.get("ok") and data is True), None, None
+def _coerce_token_item(item) -> dict | None:
+    """将字符串或字典形式的 Token 条目统一为字典，并清洗 token 字段。"""
+    if isinstance(item, str):
+        token_data = {"token": item}
+    elif isinstance(item, dict):
+        token_data = dict(item)
+    else:
+        return None
+    raw_token = token_data.get("token")
+    if raw_token is not None:
+        token_data["token"] = _sanitize_token_text(raw_token)
+    return token_data
+
+
+def _mask_token(token: str) -> str:
+    """用于结果展示的 Token 掩码（保留首尾 8 位）"""
+    if len(token) <= 20:
+        return token
+    return "...".join((token[:8], token[-8:]))
+
+
+def _collect_unique_tokens(data: dict) -> list[str]:
+    """从请求体的 token / tokens 字段收集去重后的 Token（保持顺序）。"""
+    seen: set[str] = set()
+    unique: list[str] = []
+    single = data.get("token")
+    if isinstance(single, str):
+        single = single.strip()
+        if single:
+            seen.add(single)
+            unique.append(single)
+    many = data.get("tokens")
+    if isinstance(many, list):
+        for item in many:
+            item = str(item).strip()
+            if item and item not in seen:
+                seen.add(item)
+                unique.append(item)
+    return unique
+
+
+def _pool_tokens(mgr) -> list[str]:
+    """收集所有号池中的 Token（去掉 sso= 前缀并去重）。"""
+    seen: set[str] = set()
+    unique: list[str] = []
+    for pool in mgr.pools.values():
+        for info in pool.list():
+            raw = info.token[4:] if info.token.startswith("sso=") else info.token
+            if raw not in seen:
+                seen.add(raw)
+                unique.append(raw)
+    return unique
+
+
+_USAGE_OK = (True, None, None)
+_USAGE_FAIL = (False, None, None)
 
-    if isinstance(data, dict):
-        ok = bool(res.get("ok") and data.get("ok") is True)
-        if ok:
-            return True, None, None
-        error_code = data.get("error_code")
-        message = data.get("message")
-        return False, error_code, message
 
-    return False, None, res.get("error")
+def _parse_usage_refresh_result(res: dict) -> tuple[bool, str | None, str | None]:
+    """将 run_batch 的单项结果转换为统一结构。"""
+    match res:
+        case {"data": bool() as data}:
+            return _USAGE_OK if res.get("ok") and data else _USAGE_FAIL
+        case {"data": dict() as data}:
+            if res.get("ok") and data.get("ok") is True:
+                return _USAGE_OK
+            return False, data.get("error_code"), data.get("message")
+        case dict():
+            return False, None, res.get("error")
+        case _:
+            return _USAGE_FAIL
 
 
 @router.get("/tokens", dependencies=[Depends(verify_app_key)])
@@ -74,10 +141,12 @@ async def get_tokens():
     for pool_name, pool in mgr.pools.items():
         results[pool_name] = [t.model_dump() for t in pool.list()]
     consumed_mode = get_config("token.consumed_mode_enabled", False)
-    return {
-        "tokens": results or {},
-        "consumed_mode_enabled": consumed_mode,
-    }
+    return ORJSONResponse(
+        {
+            "tokens": results or {},
+            "consumed_mode_enabled": consumed_mode,
+        }
+    )
 
 
 @router.post("/tokens", dependencies=[Depends(verify_app_key)])
@@ -85,59 +154,43 @@ async def update_tokens(data: dict):
     """更新 Token 信息"""
     storage = get_storage()
     try:
-        from app.services.token.models import TokenInfo
-
         async with storage.acquire_lock("tokens_save", timeout=10):
             existing = await storage.load_tokens() or {}
             normalized = {}
-            allowed_fields = set(TokenInfo.model_fields.keys())
-            existing_map = {}
-            for pool_name, tokens in existing.items():
-                if not isinstance(tokens, list):
-                    continue
-                pool_map = {}
-                for item in tokens:
-                    if isinstance(item, str):
-                        token_data = {"token": item}
-                    elif isinstance(item, dict):
-                        token_data = dict(item)
-                    else:
-                        continue
-                    raw_token = token_data.get("token")
-                    if raw_token is not None:
-                        token_data["token"] = _sanitize_token_text(raw_token)
-                    token_key = token_data.get("token")
-                    if isinstance(token_key, str):
-                        pool_map[token_key] = token_data
-                existing_map[pool_name] = pool_map
+            existing_map = {
+                pool_name: {
+                    token_data["token"]: token_data
+                    for token_data in map(_coerce_token_item, tokens)
+                    if token_data and isinstance(token_data.get("token"), str)
+                }
+                for pool_name, tokens in existing.items()
+                if isinstance(tokens, list)
+            }
             for pool_name, tokens in (data or {}).items():
                 if not isinstance(tokens, list):
                     continue
+                base_map = existing_map.get(pool_name, {})
                 pool_list = []
                 for item in tokens:
-                    if isinstance(item, str):
-                        token_data = {"token": item}
-                    elif isinstance(item, dict):
-                        token_data = dict(item)
-                    else:
+                    token_data = _coerce_token_item(item)
+                    if token_data is None:
                         continue
-
-                    raw_token = token_data.get("token")
-                    if raw_token is not None:
-                        token_data["token"] = _sanitize_token_text(raw_token)
                     if not token_data.get("token"):
                         logger.warning(f"Skip empty token in pool '{pool_name}'")
                         continue
 
-                    base = existing_map.get(pool_name, {}).get(
-                        token_data.get("token"), {}
-                    )
-                    merged = dict(base)
-                    merged.update(token_data)
+                    base = base_map.get(token_data["token"], {})
+                    merged = base | token_data
                     if merged.get("tags") is None:
                         merged["tags"] = []
 
-                    filtered = {k: v for k, v in merged.items() if k in allowed_fields}
+                    filtered = {
+                        k: v for k, v in merged.items() if k in _TOKEN_ALLOWED_FIELDS
+                    }
+                    # 未改动的已存储条目在保存时已校验过，跳过重复校验
+                    if base and merged == base:
+                        pool_list.append(TokenInfo.model_construct(**filtered).model_dump())
+                        continue
                     try:
                         info = TokenInfo(**filtered)
                         pool_list.append(info.model_dump())
@@ -149,11 +202,11 @@ async def update_tokens(data: dict):
             await storage.save_tokens(normalized)
             mgr = await get_token_manager()
             await mgr.reload()
-        return {"status": "success", "message": "Token 已更新"}
+        return ORJSONResponse({"status": "success", "message": "Token 已更新"})
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"update_tokens failed: {e}")
+    except Exception:
+        logger.exception("update_tokens failed")
         raise HTTPException(status_code=500, detail="Failed to update tokens")
 
 
@@ -162,17 +215,10 @@ async def refresh_tokens(data: dict):
     """刷新 Token 状态"""
     try:
         mgr = await get_token_manager()
-        tokens = []
-        if isinstance(data.get("token"), str) and data["token"].strip():
-            tokens.append(data["token"].strip())
-        if isinstance(data.get("tokens"), list):
-            tokens.extend([str(t).strip() for t in data["tokens"] if str(t).strip()])
-
-        if not tokens:
+        unique_tokens = _collect_unique_tokens(data)
+        if not unique_tokens:
             raise HTTPException(status_code=400, detail="No tokens provided")
 
-        unique_tokens = list(dict.fromkeys(tokens))
-
         raw_results = await UsageService.batch(
             unique_tokens,
             mgr,
@@ -228,11 +274,11 @@ async def refresh_tokens(data: dict):
             if challenge_message:
                 response["upstream_message"] = challenge_message
             response["refresh_pause"] = mgr.get_refresh_state()
-        return response
+        return ORJSONResponse(response)
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"refresh_tokens failed: {e}")
+    except Exception:
+        logger.exception("refresh_tokens failed")
         raise HTTPException(status_code=500, detail="Failed to refresh tokens")
 
 
@@ -240,31 +286,35 @@ async def refresh_tokens(data: dict):
 async def refresh_tokens_async(data: dict):
     """刷新 Token 状态（异步批量 + SSE 进度）"""
     mgr = await get_token_manager()
-    tokens = []
-    if isinstance(data.get("token"), str) and data["token"].strip():
-        tokens.append(data["token"].strip())
-    if isinstance(data.get("tokens"), list):
-        tokens.extend([str(t).strip() for t in data["tokens"] if str(t).strip()])
-
-    if not tokens:
+    unique_tokens = _collect_unique_tokens(data)
+    if not unique_tokens:
         raise HTTPException(status_code=400, detail="No tokens provided")
 
-    unique_tokens = list(dict.fromkeys(tokens))
-
     task = create_task(len(unique_tokens))
 
     async def _run():
         try:
+            results: dict[str, bool] = {}
+            ok_count = 0
+            fail_count = 0
+            challenge_count = 0
+            challenge_message = ""
 
             async def _on_item(item: str, res: dict):
-<<<<<<< HEAD:app/api/v1/admin_api/token.py
-                is_ok, _, _ = _parse_usage_refresh_result(res)
+                nonlocal ok_count, fail_count, challenge_count, challenge_message
+                is_ok, error_code, message = _parse_usage_refresh_result(res)
                 task.record(is_ok)
-=======
-                task.record(bool(res.get("ok")) and res.get("data") is True)
->>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b:app/api/v1/admin/token.py
+                results[item] = is_ok
+                if is_ok:
+                    ok_count += 1
+                    return
+                fail_count += 1
+                if error_code == "cloudflare_challenge":
+                    challenge_count += 1
+                    if not challenge_message and isinstance(message, str):
+                        challenge_message = message
 
-            raw_results = await UsageService.batch(
+            await UsageService.batch(
                 unique_tokens,
                 mgr,
                 include_detail=True,
@@ -276,24 +326,6 @@ async def refresh_tokens_async(data: dict):
                 task.finish_cancelled()
                 return
 
-            results: dict[str, bool] = {}
-            ok_count = 0
-            fail_count = 0
-            challenge_count = 0
-            challenge_message = ""
-            for token, res in raw_results.items():
-                is_ok, error_code, message = _parse_usage_refresh_result(res)
-                if is_ok:
-                    ok_count += 1
-                    results[token] = True
-                else:
-                    fail_count += 1
-                    results[token] = False
-                    if error_code == "cloudflare_challenge":
-                        challenge_count += 1
-                        if not challenge_message and isinstance(message, str):
-                            challenge_message = message
-
             await mgr._save(force=True)
 
             result = {
@@ -327,15 +359,13 @@ async def refresh_tokens_async(data: dict):
                 result["refresh_pause"] = mgr.get_refresh_state()
                 warning = "检测到 Cloudflare Challenge，请更新 cf_clearance 后重试。"
             task.finish(result, warning=warning)
-        except Exception as e:
-            logger.exception(f"refresh_tokens_async failed: {e}")
+        except Exception:
+            logger.exception("refresh_tokens_async failed")
             task.fail_task("Failed to refresh tokens")
         finally:
-            import asyncio
-            asyncio.create_task(expire_task(task.id, 300))
+            _spawn(expire_task(task.id, 300))
 
-    import asyncio
-    asyncio.create_task(_run())
+    _spawn(_run())
 
     return {
         "status": "success",
@@ -349,7 +379,7 @@ async def batch_stream(task_id: str, request: Request):
     app_key = get_app_key()
     if app_key:
         key = request.query_params.get("app_key")
-        if key != app_key:
+        if not secure_compare(key, app_key):
             raise HTTPException(status_code=401, detail="Invalid authentication token")
     task = get_task(task_id)
     if not task:
@@ -358,26 +388,26 @@ async def batch_stream(task_id: str, request: Request):
     async def event_stream():
         queue = task.attach()
         try:
-            yield f"data: {orjson.dumps({'type': 'snapshot', **task.snapshot()}).decode()}\n\n"
+            yield task.snapshot_bytes()
 
-            final = task.final_event()
+            final = task.final_frame()
             if final:
-                yield f"data: {orjson.dumps(final).decode()}\n\n"
+                yield final
                 return
 
             while True:
                 try:
-                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                    frame = await asyncio.wait_for(queue.get(), timeout=15)
                 except asyncio.TimeoutError:
-                    yield ": ping\n\n"
-                    final = task.final_event()
+                    yield _SSE_PING
+                    final = task.final_frame()
                     if final:
-                        yield f"data: {orjson.dumps(final).decode()}\n\n"
+                        yield final
                         return
                     continue
 
-                yield f"data: {orjson.dumps(event).decode()}\n\n"
-                if event.get("type") in ("done", "error", "cancelled"):
+                yield frame
+                if frame is task.final_frame():
                     return
         finally:
             task.detach(queue)
@@ -400,25 +430,10 @@ async def enable_nsfw(data: dict):
     try:
         mgr = await get_token_manager()
 
-        tokens = []
-        if isinstance(data.get("token"), str) and data["token"].strip():
-            tokens.append(data["token"].strip())
-        if isinstance(data.get("tokens"), list):
-            tokens.extend([str(t).strip() for t in data["tokens"] if str(t).strip()])
-
-        if not tokens:
-            for pool_name, pool in mgr.pools.items():
-                for info in pool.list():
-                    raw = (
-                        info.token[4:] if info.token.startswith("sso=") else info.token
-                    )
-                    tokens.append(raw)
-
-        if not tokens:
+        unique_tokens = _collect_unique_tokens(data) or _pool_tokens(mgr)
+        if not unique_tokens:
             raise HTTPException(status_code=400, detail="No tokens available")
 
-        unique_tokens = list(dict.fromkeys(tokens))
-
         raw_results = await NSFWService.batch(
             unique_tokens,
             mgr,
@@ -429,7 +444,7 @@ async def enable_nsfw(data: dict):
         fail_count = 0
 
         for token, res in raw_results.items():
-            masked = f"{token[:8]}...{token[-8:]}" if len(token) > 20 else token
+            masked = _mask_token(token)
             if res.get("ok") and res.get("data", {}).get("success"):
                 ok_count += 1
                 results[masked] = res.get("data", {})
@@ -447,12 +462,12 @@ async def enable_nsfw(data: dict):
             "results": results,
         }
 
-        return response
+        return ORJSONResponse(response)
 
     except HTTPException:
         raise
-    except Exception as e:
-        logger.exception(f"Enable NSFW failed: {e}")
+    except Exception:
+        logger.exception("Enable NSFW failed")
         raise HTTPException(status_code=500, detail="Failed to enable NSFW")
 
 
@@ -461,33 +476,31 @@ async def enable_nsfw_async(data: dict):
     """批量开启 NSFW (Unhinged) 模式（异步批量 + SSE 进度）"""
     mgr = await get_token_manager()
 
-    tokens = []
-    if isinstance(data.get("token"), str) and data["token"].strip():
-        tokens.append(data["token"].strip())
-    if isinstance(data.get("tokens"), list):
-        tokens.extend([str(t).strip() for t in data["tokens"] if str(t).strip()])
-
-    if not tokens:
-        for pool_name, pool in mgr.pools.items():
-            for info in pool.list():
-                raw = info.token[4:] if info.token.startswith("sso=") else info.token
-                tokens.append(raw)
-
-    if not tokens:
+    unique_tokens = _collect_unique_tokens(data) or _pool_tokens(mgr)
+    if not unique_tokens:
         raise HTTPException(status_code=400, detail="No tokens available")
 
-    unique_tokens = list(dict.fromkeys(tokens))
-
     task = create_task(len(unique_tokens))
 
     async def _run():
         try:
+            results = {}
+            ok_count = 0
+            fail_count = 0
 
             async def _on_item(item: str, res: dict):
-                ok = bool(res.get("ok") and res.get("data", {}).get("success"))
-                task.record(ok)
+                nonlocal ok_count, fail_count
+                masked = _mask_token(item)
+                if res.get("ok") and res.get("data", {}).get("success"):
+                    ok_count += 1
+                    task.record(True)
+                    results[masked] = res.get("data", {})
+                else:
+                    fail_count += 1
+                    task.record(False)
+                    results[masked] = res.get("data") or {"error": res.get("error")}
 
-            raw_results = await NSFWService.batch(
+            await NSFWService.batch(
                 unique_tokens,
                 mgr,
                 on_item=_on_item,
@@ -498,18 +511,6 @@ async def enable_nsfw_async(data: dict):
                 task.finish_cancelled()
                 return
 
-            results = {}
-            ok_count = 0
-            fail_count = 0
-            for token, res in raw_results.items():
-                masked = f"{token[:8]}...{token[-8:]}" if len(token) > 20 else token
-                if res.get("ok") and res.get("data", {}).get("success"):
-                    ok_count += 1
-                    results[masked] = res.get("data", {})
-                else:
-                    fail_count += 1
-                    results[masked] = res.get("data") or {"error": res.get("error")}
-
             await mgr._save(force=True)
 
             result = {
@@ -522,15 +523,13 @@ async def enable_nsfw_async(data: dict):
                 "results": results,
             }
             task.finish(result)
-        except Exception as e:
-            logger.exception(f"enable_nsfw_async failed: {e}")
+        except Exception:
+            logger.exception("enable_nsfw_async failed")
             task.fail_task("Failed to enable NSFW")
         finally:
-            import asyncio
-            asyncio.create_task(expire_task(task.id, 300))
+            _spawn(expire_task(task.id, 300))
 
-    import asyncio
-    asyncio.create_task(_run())
+    _spawn(_run())
 
     return {
         "status": "success",
@@ -13,8 +13,8 @@ import uuid
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
 
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
 import orjson
 
 from app.api.validators.chat import (
@@ -24,6 +24,8 @@ from app.api.validators.chat import (
 from app.api.validators.image import resolve_aspect_ratio
 from app.core.config import get_config
 from app.core.exceptions import AppException, ErrorType, ValidationException
+from app.core.orjson_request import ORJSONRoute
+from app.core.orjson_response import ORJSONResponse
 from app.services.grok.services.chat import ChatService
 from app.services.grok.services.image import ImageGenerationService
 from app.services.grok.services.image_edit import ImageEditService
@@ -43,6 +45,10 @@ class MessageItem(BaseModel):
     name: Optional[str] = None
 
 
+# 整个消息列表一次性交给 pydantic-core 序列化
+_MESSAGE_LIST_ADAPTER = TypeAdapter(List[MessageItem])
+
+
 class VideoConfig(BaseModel):
     """视频生成配置"""
 
@@ -140,6 +146,20 @@ def _validate_media_input(value: str, field_name: str, param: str):
     )
 
 
+# Starlette 只在构造响应时读取 headers，可安全复用同一字典
+# X-Accel-Buffering 关闭 nginx 等反向代理的响应缓冲，no-transform 防止中间层改写/压缩事件流
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+_SSE_MEDIA_TYPE = "text/event-stream; charset=utf-8"
+
+
+def _sse_response(stream) -> StreamingResponse:
+    return StreamingResponse(stream, media_type=_SSE_MEDIA_TYPE, headers=_SSE_HEADERS)
+
+
 <<<<<<< HEAD
 =======
 def _image_field(response_format: str) -> str:
@@ -208,11 +228,7 @@ def _streaming_error_response(exc: Exception) -> StreamingResponse:
         yield f"event: error\ndata: {orjson.dumps(payload).decode()}\n\n"
         yield "data: [DONE]\n\n"
 
-    return StreamingResponse(
-        _one_shot_error(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-    )
+    return _sse_response(_one_shot_error())
 
 def _validate_image_config(image_conf: ImageConfig, *, stream: bool):
     n = image_conf.n or 1
@@ -658,7 +674,7 @@ def validate_request(request: ChatCompletionRequest):
 
 
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
-router = APIRouter(tags=["Chat"])
+router = APIRouter(tags=["Chat"], route_class=ORJSONRoute)
 
 
 @router.post("/chat/completions")
@@ -695,11 +711,9 @@ async def chat_completions(request: ChatCompletionRequest):
         token_mgr = await get_token_manager()
         await token_mgr.reload_if_stale()
 
-        token = None
-        for pool_name in ModelService.pool_candidates_for_model(request.model):
-            token = token_mgr.get_token(pool_name)
-            if token:
-                break
+        token = token_mgr.get_any_token(
+            ModelService.pool_candidates_for_model(request.model)
+        )
 
         if not token:
             raise AppException(
@@ -722,14 +736,10 @@ async def chat_completions(request: ChatCompletionRequest):
         )
 
         if result.stream:
-            return StreamingResponse(
-                _safe_sse_stream(result.data),
-                media_type="text/event-stream",
-                headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-            )
+            return _sse_response(_safe_sse_stream(result.data))
 
         content = result.data[0] if result.data else ""
-        return JSONResponse(content=make_chat_response(request.model, content))
+        return ORJSONResponse(content=make_chat_response(request.model, content))
 
     if model_info and model_info.is_image:
 <<<<<<< HEAD
@@ -756,11 +766,9 @@ async def chat_completions(request: ChatCompletionRequest):
         token_mgr = await get_token_manager()
         await token_mgr.reload_if_stale()
 
-        token = None
-        for pool_name in ModelService.pool_candidates_for_model(request.model):
-            token = token_mgr.get_token(pool_name)
-            if token:
-                break
+        token = token_mgr.get_any_token(
+            ModelService.pool_candidates_for_model(request.model)
+        )
 
         if not token:
             raise AppException(
@@ -784,22 +792,18 @@ async def chat_completions(request: ChatCompletionRequest):
         )
 
         if result.stream:
-            return StreamingResponse(
-                _safe_sse_stream(result.data),
-                media_type="text/event-stream",
-                headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-            )
+            return _sse_response(_safe_sse_stream(result.data))
 
         content = result.data[0] if result.data else ""
         usage = result.usage_override
-        return JSONResponse(content=make_chat_response(request.model, content, usage=usage))
+        return ORJSONResponse(content=make_chat_response(request.model, content, usage=usage))
 
     if model_info and model_info.is_video:
         v_conf = request.video_config or VideoConfig()
 <<<<<<< HEAD
         result = await VideoService.completions(
             model=request.model,
-            messages=[msg.model_dump() for msg in request.messages],
+            messages=_MESSAGE_LIST_ADAPTER.dump_python(request.messages),
             stream=request.stream,
             reasoning_effort=request.reasoning_effort,
             aspect_ratio=v_conf.aspect_ratio,
@@ -812,7 +816,7 @@ async def chat_completions(request: ChatCompletionRequest):
         try:
             result = await VideoService.completions(
                 model=request.model,
-                messages=[msg.model_dump() for msg in request.messages],
+                messages=_MESSAGE_LIST_ADAPTER.dump_python(request.messages),
                 stream=request.stream,
                 reasoning_effort=request.reasoning_effort,
                 aspect_ratio=v_conf.aspect_ratio,
@@ -829,7 +833,7 @@ async def chat_completions(request: ChatCompletionRequest):
         try:
             result = await ChatService.completions(
                 model=request.model,
-                messages=[msg.model_dump() for msg in request.messages],
+                messages=_MESSAGE_LIST_ADAPTER.dump_python(request.messages),
                 stream=request.stream,
                 reasoning_effort=request.reasoning_effort,
                 temperature=request.temperature,
@@ -844,20 +848,12 @@ async def chat_completions(request: ChatCompletionRequest):
             raise
 
     if isinstance(result, dict):
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
 <<<<<<< HEAD
-    return StreamingResponse(
-        result,
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-    )
+    return _sse_response(result)
 =======
     else:
-        return StreamingResponse(
-            _safe_sse_stream(result),
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
+        return _sse_response(_safe_sse_stream(result))
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
 
 
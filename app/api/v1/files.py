@@ -2,12 +2,15 @@
 文件服务 API 路由
 """
 
-import aiofiles.os
-import re
+import asyncio
+import os
+import stat
+import string
+from functools import lru_cache
 from pathlib import Path
 from urllib.parse import unquote
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Security
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Security
 from fastapi.security import HTTPAuthorizationCredentials
 from fastapi.responses import FileResponse
 
@@ -25,10 +28,15 @@ router = APIRouter(tags=["Files"])
 BASE_DIR = DATA_DIR / "tmp"
 IMAGE_DIR = BASE_DIR / "image"
 VIDEO_DIR = BASE_DIR / "video"
+# 根目录在进程生命周期内不变，只解析一次
+_IMAGE_BASE = IMAGE_DIR.resolve()
+_VIDEO_BASE = VIDEO_DIR.resolve()
 
-FILENAME_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,255}$")
+# 删除所有合法字符后若仍有剩余，说明文件名含非法字符
+_FILENAME_STRIP_ALLOWED = str.maketrans("", "", string.ascii_letters + string.digits + "._-")
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
 ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov", ".m4v"}
+CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 def _normalize_filename(raw: str) -> str:
@@ -36,13 +44,12 @@ def _normalize_filename(raw: str) -> str:
     normalized = decoded.replace("\\", "-").replace("/", "-")
     if not normalized or ".." in normalized:
         raise HTTPException(status_code=400, detail="Invalid filename")
-    if not FILENAME_PATTERN.fullmatch(normalized):
+    if len(normalized) > 255 or normalized.translate(_FILENAME_STRIP_ALLOWED):
         raise HTTPException(status_code=400, detail="Invalid filename")
     return normalized
 
 
-def _safe_resolve(base_dir: Path, filename: str) -> Path:
-    base_resolved = base_dir.resolve()
+def _safe_resolve(base_resolved: Path, filename: str) -> Path:
     resolved = (base_resolved / filename).resolve()
     try:
         resolved.relative_to(base_resolved)
@@ -51,6 +58,41 @@ def _safe_resolve(base_dir: Path, filename: str) -> Path:
     return resolved
 
 
+async def _stat_file(path: Path) -> Optional[os.stat_result]:
+    """单次 stat 同时判断存在性与普通文件类型，结果交给 FileResponse 复用"""
+    try:
+        st = await asyncio.to_thread(os.stat, path)
+    except OSError:
+        return None
+    return st if stat.S_ISREG(st.st_mode) else None
+
+
+@lru_cache(maxsize=1024)
+def _etag_for(mtime_ns: int, size: int) -> str:
+    return f'"{mtime_ns:x}-{size:x}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _file_response(
+    request: Request, file_path: Path, st: os.stat_result, media_type: str
+) -> Response:
+    """条件请求命中时返回 304，否则返回带 ETag 的文件响应"""
+    etag = _etag_for(st.st_mtime_ns, st.st_size)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, media_type=media_type, headers=headers, stat_result=st)
+
+
 async def verify_files_access(
     auth: Optional[HTTPAuthorizationCredentials] = Security(security),
 ) -> Optional[str]:
@@ -60,51 +102,51 @@ async def verify_files_access(
 
 
 @router.get("/image/{filename:path}")
-async def get_image(filename: str, _: Optional[str] = Depends(verify_files_access)):
+async def get_image(
+    filename: str,
+    request: Request,
+    _: Optional[str] = Depends(verify_files_access),
+):
     """
     获取图片文件
     """
     normalized_name = _normalize_filename(filename)
-    file_path = _safe_resolve(IMAGE_DIR, normalized_name)
+    file_path = _safe_resolve(_IMAGE_BASE, normalized_name)
     if file_path.suffix.lower() not in ALLOWED_IMAGE_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported image extension")
 
-    if await aiofiles.os.path.exists(file_path):
-        if await aiofiles.os.path.isfile(file_path):
-            content_type = "image/jpeg"
-            if file_path.suffix.lower() == ".png":
-                content_type = "image/png"
-            elif file_path.suffix.lower() == ".webp":
-                content_type = "image/webp"
-
-            # 增加缓存头，支持高并发场景下的浏览器/CDN缓存
-            return FileResponse(
-                file_path,
-                media_type=content_type,
-                headers={"Cache-Control": "public, max-age=31536000, immutable"},
-            )
+    st = await _stat_file(file_path)
+    if st is not None:
+        content_type = "image/jpeg"
+        if file_path.suffix.lower() == ".png":
+            content_type = "image/png"
+        elif file_path.suffix.lower() == ".webp":
+            content_type = "image/webp"
+
+        # 增加缓存头，支持高并发场景下的浏览器/CDN缓存
+        return _file_response(request, file_path, st, content_type)
 
     logger.warning(f"Image not found: {normalized_name}")
     raise HTTPException(status_code=404, detail="Image not found")
 
 
 @router.get("/video/{filename:path}")
-async def get_video(filename: str, _: Optional[str] = Depends(verify_files_access)):
+async def get_video(
+    filename: str,
+    request: Request,
+    _: Optional[str] = Depends(verify_files_access),
+):
     """
     获取视频文件
     """
     normalized_name = _normalize_filename(filename)
-    file_path = _safe_resolve(VIDEO_DIR, normalized_name)
+    file_path = _safe_resolve(_VIDEO_BASE, normalized_name)
     if file_path.suffix.lower() not in ALLOWED_VIDEO_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Unsupported video extension")
 
-    if await aiofiles.os.path.exists(file_path):
-        if await aiofiles.os.path.isfile(file_path):
-            return FileResponse(
-                file_path,
-                media_type="video/mp4",
-                headers={"Cache-Control": "public, max-age=31536000, immutable"},
-            )
+    st = await _stat_file(file_path)
+    if st is not None:
+        return _file_response(request, file_path, st, "video/mp4")
 
     logger.warning(f"Video not found: {normalized_name}")
     raise HTTPException(status_code=404, detail="Video not found")
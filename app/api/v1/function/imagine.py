@@ -1,77 +1,143 @@
 import asyncio
+import contextlib
+import heapq
+import os
 import time
-import uuid
-from typing import Optional, List, Dict, Any
+from types import MappingProxyType
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NotRequired,
+    Optional,
+    TypedDict,
+    Union,
+)
 
 import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 from app.core.auth import (
     verify_function_key,
     get_function_api_key,
     is_function_enabled,
+    secure_compare,
 )
 from app.core.config import get_config
 from app.core.logger import logger
-from app.api.v1.image import resolve_aspect_ratio
+from app.api.validators.image import resolve_aspect_ratio
 from app.services.grok.services.image import ImageGenerationService
 from app.services.grok.services.model import ModelService
 from app.services.token.manager import get_token_manager
 
 router = APIRouter()
 
+# 服务对象无实例状态，进程内共享
+_GENERATION_SERVICE = ImageGenerationService()
+
 IMAGINE_SESSION_TTL = 600
-_IMAGINE_SESSIONS: dict[str, dict] = {}
-_IMAGINE_SESSIONS_LOCK = asyncio.Lock()
+# 会话创建后不再修改，以只读视图存放，读取方直接共享，无需拷贝
+_IMAGINE_SESSIONS: dict[str, Mapping[str, Any]] = {}
+# (过期时间, task_id) 最小堆，时间取自 time.monotonic()；会话表的读写都在事件循环内同步完成，无需加锁
+_IMAGINE_EXPIRY: list[tuple[float, str]] = []
+
+
+def _error_blob(message: str, code: str) -> bytes:
+    return orjson.dumps({"type": "error", "message": message, "code": code})
+
+
+def _sse_frame(blob: bytes) -> bytes:
+    # 一次格式化生成整帧，避免两次拼接产生的中间对象
+    return b"data: %b\n\n" % blob
+
+
+# 状态事件固定的 type/status 前缀预先编码，只序列化动态字段后拼接
+_STATUS_PREFIXES = {
+    status: b'{"type":"status","status":"%s",' % status.encode()
+    for status in ("running", "round_done", "stopped")
+}
+
 
+def _status_blob(status: str, fields: Dict[str, Any]) -> bytes:
+    return _STATUS_PREFIXES[status] + orjson.dumps(fields)[1:]
 
-async def _clean_sessions(now: float) -> None:
-    expired = [
-        key
-        for key, info in _IMAGINE_SESSIONS.items()
-        if now - float(info.get("created_at") or 0) > IMAGINE_SESSION_TTL
-    ]
-    for key in expired:
+
+# 固定内容的错误事件，导入时序列化一次
+_ERR_MODEL_NOT_SUPPORTED = _error_blob(
+    "Image model is not available.", "model_not_supported"
+)
+_ERR_NO_TOKEN = _error_blob(
+    "No available tokens. Please try again later.", "rate_limit_exceeded"
+)
+_ERR_EMPTY_IMAGE = _error_blob(
+    "Image generation returned empty data.", "empty_image"
+)
+_ERR_INVALID_PAYLOAD = _error_blob("Invalid message format.", "invalid_payload")
+_ERR_INVALID_PROMPT = _error_blob("Prompt cannot be empty.", "invalid_prompt")
+_ERR_INVALID_ACTION = _error_blob("Unknown action.", "invalid_action")
+
+
+def _clean_sessions(now: float) -> None:
+    """只弹出堆顶已过期的条目，未过期时 O(1) 返回"""
+    while _IMAGINE_EXPIRY and _IMAGINE_EXPIRY[0][0] < now:
+        _, key = heapq.heappop(_IMAGINE_EXPIRY)
         _IMAGINE_SESSIONS.pop(key, None)
 
 
-def _parse_sse_chunk(chunk: str) -> Optional[Dict[str, Any]]:
+def _parse_sse_chunk(chunk: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """单遍扫描一个 SSE 事件块，按行偏移切片，不做 splitlines/逐行 strip"""
     if not chunk:
         return None
+    if isinstance(chunk, str):
+        newline, data_prefix, event_prefix, done = "\n", "data:", "event:", "[DONE]"
+    else:
+        newline, data_prefix, event_prefix, done = b"\n", b"data:", b"event:", b"[DONE]"
     event = None
-    data_lines: List[str] = []
-    for raw in str(chunk).splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line.startswith("event:"):
-            event = line[6:].strip()
-            continue
-        if line.startswith("data:"):
-            data_lines.append(line[5:].strip())
-    if not data_lines:
+    data_parts: list = []
+    start = 0
+    size = len(chunk)
+    while start < size:
+        end = chunk.find(newline, start)
+        if end < 0:
+            end = size
+        if chunk.startswith(data_prefix, start, end):
+            data_parts.append(chunk[start + 5 : end].strip())
+        elif chunk.startswith(event_prefix, start, end):
+            event = chunk[start + 6 : end].strip()
+        start = end + 1
+    if not data_parts:
         return None
-    data_str = "\n".join(data_lines)
-    if data_str == "[DONE]":
+    # 常见情况只有一行 data，直接解析切片，无需拼接
+    data = data_parts[0] if len(data_parts) == 1 else newline.join(data_parts)
+    if data == done:
         return None
     try:
-        payload = orjson.loads(data_str)
+        payload = orjson.loads(data)
     except orjson.JSONDecodeError:
         return None
     if event and isinstance(payload, dict) and "type" not in payload:
-        payload["type"] = event
+        payload["type"] = event if isinstance(event, str) else event.decode()
     return payload
 
 
+# 调用方（Pydantic/Query）通常已给出 int，精确类型判断走快路径，不进入 try/int()
 def _normalize_quantity(value: Any, default: int = 0) -> int:
     if value is None:
         return default
-    try:
-        quantity = int(value)
-    except (TypeError, ValueError):
-        raise ValueError("quantity must be an integer")
+    if type(value) is int:
+        quantity = value
+    else:
+        try:
+            quantity = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("quantity must be an integer")
     if quantity < 0 or quantity > 200:
         raise ValueError("quantity must be between 0 and 200")
     return quantity
@@ -80,30 +146,37 @@ def _normalize_quantity(value: Any, default: int = 0) -> int:
 def _normalize_concurrent(value: Any, default: int = 1) -> int:
     if value is None:
         return default
-    try:
-        concurrent = int(value)
-    except (TypeError, ValueError):
-        raise ValueError("concurrent must be an integer")
+    if type(value) is int:
+        concurrent = value
+    else:
+        try:
+            concurrent = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("concurrent must be an integer")
     if concurrent < 1 or concurrent > 6:
         raise ValueError("concurrent must be between 1 and 6")
     return concurrent
 
 
+_IMAGE_PAYLOAD_KEYS = ("b64_json", "url", "image")
+
+
+def _has_image(payload: Dict[str, Any]) -> bool:
+    for key in _IMAGE_PAYLOAD_KEYS:
+        if payload.get(key):
+            return True
+    return False
+
+
 def _is_final_image_payload(payload: Dict[str, Any]) -> bool:
+    # 上游 type/stage 均为小写字面量，直接比较，无需 str()/lower()
     if not isinstance(payload, dict):
         return False
-    payload_type = str(payload.get("type") or "")
+    payload_type = payload.get("type")
     if payload_type == "image_generation.completed":
         return True
-    if payload_type == "image" and (
-        payload.get("b64_json") or payload.get("url") or payload.get("image")
-    ):
-        return True
-    stage = str(payload.get("stage") or "").lower()
-    if stage == "final" and (
-        payload.get("b64_json") or payload.get("url") or payload.get("image")
-    ):
-        return True
+    if payload_type == "image" or payload.get("stage") == "final":
+        return _has_image(payload)
     return False
 
 
@@ -114,11 +187,12 @@ async def _new_session(
     quantity: int,
     concurrent: int,
 ) -> str:
-    task_id = uuid.uuid4().hex
-    now = time.time()
-    async with _IMAGINE_SESSIONS_LOCK:
-        await _clean_sessions(now)
-        _IMAGINE_SESSIONS[task_id] = {
+    # 与 uuid4 同源（os.urandom），省去 UUID 对象构造；task_id 可代替 function_key 鉴权，必须不可预测
+    task_id = os.urandom(16).hex()
+    now = time.monotonic()
+    _clean_sessions(now)
+    _IMAGINE_SESSIONS[task_id] = MappingProxyType(
+        {
             "prompt": prompt,
             "aspect_ratio": aspect_ratio,
             "nsfw": nsfw,
@@ -126,42 +200,177 @@ async def _new_session(
             "concurrent": concurrent,
             "created_at": now,
         }
+    )
+    heapq.heappush(_IMAGINE_EXPIRY, (now + IMAGINE_SESSION_TTL, task_id))
     return task_id
 
 
-async def _get_session(task_id: str) -> Optional[dict]:
+async def _get_session(task_id: str) -> Optional[Mapping[str, Any]]:
     if not task_id:
         return None
-    now = time.time()
-    async with _IMAGINE_SESSIONS_LOCK:
-        await _clean_sessions(now)
-        info = _IMAGINE_SESSIONS.get(task_id)
-        if not info:
-            return None
-        created_at = float(info.get("created_at") or 0)
-        if now - created_at > IMAGINE_SESSION_TTL:
-            _IMAGINE_SESSIONS.pop(task_id, None)
-            return None
-        return dict(info)
+    now = time.monotonic()
+    # 读路径只校验自身是否过期，整体清理放在新建会话时进行
+    info = _IMAGINE_SESSIONS.get(task_id)
+    if not info:
+        return None
+    if now - info["created_at"] > IMAGINE_SESSION_TTL:
+        _IMAGINE_SESSIONS.pop(task_id, None)
+        return None
+    return info
 
 
 async def _drop_session(task_id: str) -> None:
     if not task_id:
         return
-    async with _IMAGINE_SESSIONS_LOCK:
-        _IMAGINE_SESSIONS.pop(task_id, None)
+    _IMAGINE_SESSIONS.pop(task_id, None)
 
 
 async def _drop_sessions(task_ids: List[str]) -> int:
     if not task_ids:
         return 0
-    removed = 0
-    async with _IMAGINE_SESSIONS_LOCK:
-        for task_id in task_ids:
-            if task_id and task_id in _IMAGINE_SESSIONS:
-                _IMAGINE_SESSIONS.pop(task_id, None)
-                removed += 1
-    return removed
+    # pop 同时完成存在判断与删除，每个 task_id 只查一次表
+    return sum(
+        1
+        for task_id in task_ids
+        if task_id and _IMAGINE_SESSIONS.pop(task_id, None) is not None
+    )
+
+
+async def _imagine_events(
+    *,
+    prompt: str,
+    aspect_ratio: str,
+    nsfw: Optional[bool],
+    target_count: int,
+    batch_size: int,
+    should_stop: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[bytes]:
+    """
+    一次 Imagine 运行的事件流，WS 与 SSE 共用
+
+    逐个产出已序列化的 JSON 事件，由调用方按各自协议发送；
+    每轮开始前调用 should_stop 判断是否结束。
+    """
+    model_info = ModelService.get("grok-imagine-1.0")
+    if not model_info or not model_info.is_image:
+        yield _ERR_MODEL_NOT_SUPPORTED
+        return
+
+    token_mgr = await get_token_manager()
+    pool_candidates = ModelService.pool_candidates_for_model(model_info.model_id)
+    run_id = os.urandom(16).hex()
+    sequence = 0
+    final_count = 0
+    stop_reason = "stopped"
+    round_index = 0
+
+    yield _status_blob(
+        "running",
+        {
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "run_id": run_id,
+            "target_count": target_count,
+            "batch_size": batch_size,
+        },
+    )
+
+    while not await should_stop():
+        try:
+            if target_count > 0 and final_count >= target_count:
+                stop_reason = "quantity_reached"
+                break
+
+            round_index += 1
+            remaining = target_count - final_count if target_count > 0 else batch_size
+            request_n = (
+                batch_size if target_count <= 0 else max(1, min(batch_size, remaining))
+            )
+
+            await token_mgr.reload_if_stale()
+            token = token_mgr.get_any_token(pool_candidates)
+
+            if not token:
+                yield _ERR_NO_TOKEN
+                await asyncio.sleep(2)
+                continue
+
+            result = await _GENERATION_SERVICE.generate(
+                token_mgr=token_mgr,
+                token=token,
+                model_info=model_info,
+                prompt=prompt,
+                n=request_n,
+                response_format="b64_json",
+                size="1024x1024",
+                aspect_ratio=aspect_ratio,
+                stream=True,
+                enable_nsfw=nsfw,
+            )
+            if result.stream:
+                async for chunk in result.data:
+                    payload = _parse_sse_chunk(chunk)
+                    if not payload:
+                        continue
+                    if isinstance(payload, dict):
+                        payload.setdefault("run_id", run_id)
+                    yield orjson.dumps(payload)
+                    if _is_final_image_payload(payload):
+                        final_count += 1
+                        if target_count > 0 and final_count >= target_count:
+                            stop_reason = "quantity_reached"
+                            break
+            else:
+                images = [img for img in result.data if img and img != "error"]
+                if images:
+                    for img_b64 in images:
+                        sequence += 1
+                        yield orjson.dumps(
+                            {
+                                "type": "image",
+                                "b64_json": img_b64,
+                                "sequence": sequence,
+                                "created_at": time.time_ns() // 1_000_000,
+                                "aspect_ratio": aspect_ratio,
+                                "run_id": run_id,
+                            }
+                        )
+                        final_count += 1
+                        if target_count > 0 and final_count >= target_count:
+                            stop_reason = "quantity_reached"
+                            break
+                else:
+                    yield _ERR_EMPTY_IMAGE
+
+            yield _status_blob(
+                "round_done",
+                {
+                    "run_id": run_id,
+                    "round": round_index,
+                    "generated_count": final_count,
+                    "target_count": target_count,
+                    "request_n": request_n,
+                },
+            )
+        except asyncio.CancelledError:
+            break
+        except Exception as e:
+            logger.warning(f"Imagine stream error: {e}")
+            yield _error_blob(str(e), "internal_error")
+            await asyncio.sleep(1.5)
+
+        if stop_reason == "quantity_reached":
+            break
+
+    yield _status_blob(
+        "stopped",
+        {
+            "run_id": run_id,
+            "reason": stop_reason,
+            "generated_count": final_count,
+            "target_count": target_count,
+        },
+    )
 
 
 @router.websocket("/imagine/ws")
@@ -181,7 +390,7 @@ async def function_imagine_ws(websocket: WebSocket):
             ok = function_enabled
         else:
             key = websocket.query_params.get("function_key")
-            ok = key == function_key
+            ok = secure_compare(key, function_key)
 
     if not ok:
         await websocket.close(code=1008)
@@ -191,9 +400,11 @@ async def function_imagine_ws(websocket: WebSocket):
     stop_event = asyncio.Event()
     run_task: Optional[asyncio.Task] = None
 
-    async def _send(payload: dict) -> bool:
+    async def _send(payload: Union[dict, bytes]) -> bool:
+        # bytes 为已序列化的 JSON（如预编码的错误事件）
+        data = payload if isinstance(payload, bytes) else orjson.dumps(payload)
         try:
-            await websocket.send_text(orjson.dumps(payload).decode())
+            await websocket.send_text(data.decode())
             return True
         except Exception:
             return False
@@ -217,189 +428,47 @@ async def function_imagine_ws(websocket: WebSocket):
         quantity: int = 0,
         concurrent: int = 1,
     ):
-        model_id = "grok-imagine-1.0"
-        model_info = ModelService.get(model_id)
-        if not model_info or not model_info.is_image:
-            await _send(
-                {
-                    "type": "error",
-                    "message": "Image model is not available.",
-                    "code": "model_not_supported",
-                }
-            )
-            return
-
-        token_mgr = await get_token_manager()
-        run_id = uuid.uuid4().hex
-        final_count = 0
-        target_count = max(0, int(quantity or 0))
-        batch_size = max(1, int(concurrent or 1))
-        stop_reason = "stopped"
-        round_index = 0
-
-        await _send(
-            {
-                "type": "status",
-                "status": "running",
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "run_id": run_id,
-                "target_count": target_count,
-                "batch_size": batch_size,
-            }
+        async def _should_stop() -> bool:
+            return stop_event.is_set()
+
+        events = _imagine_events(
+            prompt=prompt,
+            aspect_ratio=aspect_ratio,
+            nsfw=nsfw,
+            target_count=max(0, int(quantity or 0)),
+            batch_size=max(1, int(concurrent or 1)),
+            should_stop=_should_stop,
         )
-
-        while not stop_event.is_set():
+        async with contextlib.aclosing(events):
             try:
-                if target_count > 0 and final_count >= target_count:
-                    stop_reason = "quantity_reached"
-                    break
-
-                round_index += 1
-                remaining = (
-                    target_count - final_count if target_count > 0 else batch_size
-                )
-                request_n = (
-                    batch_size if target_count <= 0 else max(1, min(batch_size, remaining))
-                )
-
-                await token_mgr.reload_if_stale()
-                token = None
-                for pool_name in ModelService.pool_candidates_for_model(
-                    model_info.model_id
-                ):
-                    token = token_mgr.get_token(pool_name)
-                    if token:
-                        break
-
-                if not token:
-                    await _send(
-                        {
-                            "type": "error",
-                            "message": "No available tokens. Please try again later.",
-                            "code": "rate_limit_exceeded",
-                        }
-                    )
-                    await asyncio.sleep(2)
-                    continue
-
-                result = await ImageGenerationService().generate(
-                    token_mgr=token_mgr,
-                    token=token,
-                    model_info=model_info,
-                    prompt=prompt,
-                    n=request_n,
-                    response_format="b64_json",
-                    size="1024x1024",
-                    aspect_ratio=aspect_ratio,
-                    stream=True,
-                    enable_nsfw=nsfw,
-                )
-                if result.stream:
-                    async for chunk in result.data:
-                        payload = _parse_sse_chunk(chunk)
-                        if not payload:
-                            continue
-                        if isinstance(payload, dict):
-                            payload.setdefault("run_id", run_id)
-                        await _send(payload)
-                        if _is_final_image_payload(payload):
-                            final_count += 1
-                            if target_count > 0 and final_count >= target_count:
-                                stop_reason = "quantity_reached"
-                                break
-                else:
-                    images = [img for img in result.data if img and img != "error"]
-                    if images:
-                        for img_b64 in images:
-                            await _send(
-                                {
-                                    "type": "image",
-                                    "b64_json": img_b64,
-                                    "created_at": int(time.time() * 1000),
-                                    "aspect_ratio": aspect_ratio,
-                                    "run_id": run_id,
-                                }
-                            )
-                            final_count += 1
-                            if target_count > 0 and final_count >= target_count:
-                                stop_reason = "quantity_reached"
-                                break
-                    else:
-                        await _send(
-                            {
-                                "type": "error",
-                                "message": "Image generation returned empty data.",
-                                "code": "empty_image",
-                            }
-                        )
-
-                await _send(
-                    {
-                        "type": "status",
-                        "status": "round_done",
-                        "run_id": run_id,
-                        "round": round_index,
-                        "generated_count": final_count,
-                        "target_count": target_count,
-                        "request_n": request_n,
-                    }
-                )
-
+                async for blob in events:
+                    await _send(blob)
             except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.warning(f"Imagine stream error: {e}")
-                await _send(
-                    {
-                        "type": "error",
-                        "message": str(e),
-                        "code": "internal_error",
-                    }
-                )
-                await asyncio.sleep(1.5)
-
-        await _send(
-            {
-                "type": "status",
-                "status": "stopped",
-                "run_id": run_id,
-                "reason": stop_reason,
-                "generated_count": final_count,
-                "target_count": target_count,
-            }
-        )
+                # 取消通常落在事件流内部并由其收尾；落在发送处时同样正常结束任务
+                pass
 
     try:
         while True:
             try:
-                raw = await websocket.receive_text()
+                message = await websocket.receive()
             except (RuntimeError, WebSocketDisconnect):
                 break
+            if message["type"] == "websocket.disconnect":
+                break
+            # 文本帧与二进制帧都直接交给 orjson，二进制帧无需先解码为 str
+            raw = message.get("bytes") or message.get("text") or b""
 
             try:
                 payload = orjson.loads(raw)
             except Exception:
-                await _send(
-                    {
-                        "type": "error",
-                        "message": "Invalid message format.",
-                        "code": "invalid_payload",
-                    }
-                )
+                await _send(_ERR_INVALID_PAYLOAD)
                 continue
 
             action = payload.get("type")
             if action == "start":
                 prompt = str(payload.get("prompt") or "").strip()
                 if not prompt:
-                    await _send(
-                        {
-                            "type": "error",
-                            "message": "Prompt cannot be empty.",
-                            "code": "invalid_prompt",
-                        }
-                    )
+                    await _send(_ERR_INVALID_PROMPT)
                     continue
                 aspect_ratio = resolve_aspect_ratio(
                     str(payload.get("aspect_ratio") or "2:3").strip() or "2:3"
@@ -444,13 +513,7 @@ async def function_imagine_ws(websocket: WebSocket):
             elif action == "stop":
                 await _stop_run()
             else:
-                await _send(
-                    {
-                        "type": "error",
-                        "message": "Unknown action.",
-                        "code": "invalid_action",
-                    }
-                )
+                await _send(_ERR_INVALID_ACTION)
 
     except WebSocketDisconnect:
         logger.debug("WebSocket disconnected by client")
@@ -492,7 +555,7 @@ async def function_imagine_sse(
                 raise HTTPException(status_code=401, detail="Function access is disabled")
         else:
             key = request.query_params.get("function_key")
-            if key != function_key:
+            if not secure_compare(key, function_key):
                 raise HTTPException(status_code=401, detail="Invalid authentication token")
 
     if session:
@@ -516,130 +579,26 @@ async def function_imagine_sse(
         if nsfw is not None:
             nsfw = str(nsfw).lower() in ("1", "true", "yes", "on")
 
+    async def _should_stop() -> bool:
+        if await request.is_disconnected():
+            return True
+        if task_id and not await _get_session(task_id):
+            return True
+        return False
+
     async def event_stream():
+        events = _imagine_events(
+            prompt=prompt,
+            aspect_ratio=ratio,
+            nsfw=nsfw,
+            target_count=target_count,
+            batch_size=batch_size,
+            should_stop=_should_stop,
+        )
         try:
-            model_id = "grok-imagine-1.0"
-            model_info = ModelService.get(model_id)
-            if not model_info or not model_info.is_image:
-                yield (
-                    f"data: {orjson.dumps({'type': 'error', 'message': 'Image model is not available.', 'code': 'model_not_supported'}).decode()}\n\n"
-                )
-                return
-
-            token_mgr = await get_token_manager()
-            sequence = 0
-            run_id = uuid.uuid4().hex
-            final_count = 0
-            stop_reason = "stopped"
-            round_index = 0
-
-            yield (
-                f"data: {orjson.dumps({'type': 'status', 'status': 'running', 'prompt': prompt, 'aspect_ratio': ratio, 'run_id': run_id, 'target_count': target_count, 'batch_size': batch_size}).decode()}\n\n"
-            )
-
-            while True:
-                if await request.is_disconnected():
-                    break
-                if task_id:
-                    session_alive = await _get_session(task_id)
-                    if not session_alive:
-                        break
-
-                try:
-                    if target_count > 0 and final_count >= target_count:
-                        stop_reason = "quantity_reached"
-                        break
-
-                    round_index += 1
-                    remaining = (
-                        target_count - final_count if target_count > 0 else batch_size
-                    )
-                    request_n = (
-                        batch_size if target_count <= 0 else max(1, min(batch_size, remaining))
-                    )
-
-                    await token_mgr.reload_if_stale()
-                    token = None
-                    for pool_name in ModelService.pool_candidates_for_model(
-                        model_info.model_id
-                    ):
-                        token = token_mgr.get_token(pool_name)
-                        if token:
-                            break
-
-                    if not token:
-                        yield (
-                            f"data: {orjson.dumps({'type': 'error', 'message': 'No available tokens. Please try again later.', 'code': 'rate_limit_exceeded'}).decode()}\n\n"
-                        )
-                        await asyncio.sleep(2)
-                        continue
-
-                    result = await ImageGenerationService().generate(
-                        token_mgr=token_mgr,
-                        token=token,
-                        model_info=model_info,
-                        prompt=prompt,
-                        n=request_n,
-                        response_format="b64_json",
-                        size="1024x1024",
-                        aspect_ratio=ratio,
-                        stream=True,
-                        enable_nsfw=nsfw,
-                    )
-                    if result.stream:
-                        async for chunk in result.data:
-                            payload = _parse_sse_chunk(chunk)
-                            if not payload:
-                                continue
-                            if isinstance(payload, dict):
-                                payload.setdefault("run_id", run_id)
-                            yield f"data: {orjson.dumps(payload).decode()}\n\n"
-                            if _is_final_image_payload(payload):
-                                final_count += 1
-                                if target_count > 0 and final_count >= target_count:
-                                    stop_reason = "quantity_reached"
-                                    break
-                    else:
-                        images = [img for img in result.data if img and img != "error"]
-                        if images:
-                            for img_b64 in images:
-                                sequence += 1
-                                payload = {
-                                    "type": "image",
-                                    "b64_json": img_b64,
-                                    "sequence": sequence,
-                                    "created_at": int(time.time() * 1000),
-                                    "aspect_ratio": ratio,
-                                    "run_id": run_id,
-                                }
-                                yield f"data: {orjson.dumps(payload).decode()}\n\n"
-                                final_count += 1
-                                if target_count > 0 and final_count >= target_count:
-                                    stop_reason = "quantity_reached"
-                                    break
-                        else:
-                            yield (
-                                f"data: {orjson.dumps({'type': 'error', 'message': 'Image generation returned empty data.', 'code': 'empty_image'}).decode()}\n\n"
-                            )
-
-                    yield (
-                        f"data: {orjson.dumps({'type': 'status', 'status': 'round_done', 'run_id': run_id, 'round': round_index, 'generated_count': final_count, 'target_count': target_count, 'request_n': request_n}).decode()}\n\n"
-                    )
-                except asyncio.CancelledError:
-                    break
-                except Exception as e:
-                    logger.warning(f"Imagine SSE error: {e}")
-                    yield (
-                        f"data: {orjson.dumps({'type': 'error', 'message': str(e), 'code': 'internal_error'}).decode()}\n\n"
-                    )
-                    await asyncio.sleep(1.5)
-
-                if stop_reason == "quantity_reached":
-                    break
-
-            yield (
-                f"data: {orjson.dumps({'type': 'status', 'status': 'stopped', 'run_id': run_id, 'reason': stop_reason, 'generated_count': final_count, 'target_count': target_count}).decode()}\n\n"
-            )
+            async with contextlib.aclosing(events):
+                async for blob in events:
+                    yield _sse_frame(blob)
         finally:
             if task_id:
                 await _drop_session(task_id)
@@ -660,26 +619,54 @@ async def function_imagine_config():
     }
 
 
-class ImagineStartRequest(BaseModel):
+class ImagineStartRequest(TypedDict):
     prompt: str
-    aspect_ratio: Optional[str] = "2:3"
-    nsfw: Optional[bool] = None
-    quantity: Optional[int] = 0
-    concurrent: Optional[int] = 1
+    aspect_ratio: NotRequired[Optional[str]]
+    nsfw: NotRequired[Optional[bool]]
+    quantity: NotRequired[Optional[int]]
+    concurrent: NotRequired[Optional[int]]
+
+
+# 请求体由 pydantic-core 直接从 JSON 字节校验成 dict，不实例化模型；
+# 字段类型与原 Pydantic 模型一致（宽松模式），可接受的请求体与报错保持不变
+_START_REQUEST_ADAPTER = TypeAdapter(ImagineStartRequest)
+_START_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": _START_REQUEST_ADAPTER.json_schema()}
+        },
+    }
+}
 
 
-@router.post("/imagine/start", dependencies=[Depends(verify_function_key)])
-async def function_imagine_start(data: ImagineStartRequest):
-    prompt = (data.prompt or "").strip()
+@router.post(
+    "/imagine/start",
+    dependencies=[Depends(verify_function_key)],
+    openapi_extra=_START_REQUEST_OPENAPI,
+)
+async def function_imagine_start(request: Request):
+    try:
+        data = _START_REQUEST_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [
+                {**err, "loc": ("body", *err["loc"])}
+                for err in e.errors(include_url=False)
+            ]
+        )
+
+    prompt = data["prompt"].strip()
     if not prompt:
         raise HTTPException(status_code=400, detail="Prompt cannot be empty")
-    ratio = resolve_aspect_ratio(str(data.aspect_ratio or "2:3").strip() or "2:3")
+    ratio = resolve_aspect_ratio(str(data.get("aspect_ratio") or "2:3").strip() or "2:3")
+    nsfw = data.get("nsfw")
     try:
-        quantity = _normalize_quantity(data.quantity, default=0)
-        concurrent = _normalize_concurrent(data.concurrent, default=1)
+        quantity = _normalize_quantity(data.get("quantity"), default=0)
+        concurrent = _normalize_concurrent(data.get("concurrent"), default=1)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    task_id = await _new_session(prompt, ratio, data.nsfw, quantity, concurrent)
+    task_id = await _new_session(prompt, ratio, nsfw, quantity, concurrent)
     return {
         "task_id": task_id,
         "aspect_ratio": ratio,
@@ -2,14 +2,22 @@
 Image Generation API 路由
 """
 
-import base64
+import asyncio
+import contextlib
+import io
 import time
-from pathlib import Path
-from typing import List, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
-from fastapi import APIRouter, File, Form, UploadFile
-from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel, Field, ValidationError
+import orjson
+
+try:
+    from pybase64 import b64encode  # SIMD 加速，可选依赖
+except ImportError:
+    from base64 import b64encode
+
+from fastapi import APIRouter, File, Form, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
 from app.api.validators.image import (
     normalize_image_response_format,
@@ -19,14 +27,24 @@ from app.api.validators.image import (
     validate_image_generation_model,
     validate_image_request_common,
 )
-from app.core.config import get_config
+from app.core.config import config_version, get_config
 from app.core.exceptions import AppException, ErrorType, ValidationException
+from app.core.orjson_request import ORJSONRoute
+from app.core.orjson_response import ORJSONResponse
 from app.services.grok.services.image import ImageGenerationService
 from app.services.grok.services.image_edit import ImageEditService
 from app.services.grok.services.model import ModelService
 from app.services.token import get_token_manager
 
-router = APIRouter(tags=["Images"])
+router = APIRouter(
+    tags=["Images"],
+    route_class=ORJSONRoute,
+    default_response_class=ORJSONResponse,
+)
+
+# 服务对象无实例状态，进程内共享
+_GENERATION_SERVICE = ImageGenerationService()
+_EDIT_SERVICE = ImageEditService()
 
 
 class ImageGenerationRequest(BaseModel):
@@ -45,23 +63,6 @@ class ImageGenerationRequest(BaseModel):
     stream: Optional[bool] = Field(False, description="是否流式输出")
 
 
-class ImageEditRequest(BaseModel):
-    """图片编辑请求 - OpenAI 兼容"""
-
-    prompt: str = Field(..., description="编辑描述")
-    model: Optional[str] = Field("grok-imagine-1.0-edit", description="模型名称")
-    image: Optional[Union[str, List[str]]] = Field(None, description="待编辑图片文件")
-    n: Optional[int] = Field(1, ge=1, le=10, description="生成数量 (1-10)")
-    size: Optional[str] = Field(
-        "1024x1024",
-        description="图片尺寸: 1280x720, 720x1280, 1792x1024, 1024x1792, 1024x1024",
-    )
-    quality: Optional[str] = Field("standard", description="图片质量 (暂不支持)")
-    response_format: Optional[str] = Field(None, description="响应格式")
-    style: Optional[str] = Field(None, description="风格 (暂不支持)")
-    stream: Optional[bool] = Field(False, description="是否流式输出")
-
-
 def validate_generation_request(request: ImageGenerationRequest) -> None:
     model = request.model or "grok-imagine-1.0"
     validate_image_generation_model(model)
@@ -71,7 +72,6 @@ def validate_generation_request(request: ImageGenerationRequest) -> None:
         stream=bool(request.stream),
         response_format=request.response_format,
         size=request.size,
-        allow_ws_stream=True,
         n_param="n",
         stream_n_param="stream",
         response_format_param="response_format",
@@ -79,16 +79,23 @@ def validate_generation_request(request: ImageGenerationRequest) -> None:
     )
 
 
-def validate_edit_request(request: ImageEditRequest, images: List[UploadFile]) -> None:
-    model = request.model or "grok-imagine-1.0-edit"
+def validate_edit_request(
+    *,
+    prompt: str,
+    model: str,
+    n: int,
+    stream: bool,
+    response_format: Optional[str],
+    size: Optional[str],
+    images: List[UploadFile],
+) -> None:
     validate_image_edit_model(model)
     validate_image_request_common(
-        prompt=request.prompt,
-        n=int(request.n or 1),
-        stream=bool(request.stream),
-        response_format=request.response_format,
-        size=request.size,
-        allow_ws_stream=False,
+        prompt=prompt,
+        n=n,
+        stream=stream,
+        response_format=response_format,
+        size=size,
         n_param="n",
         stream_n_param="stream",
         response_format_param="response_format",
@@ -108,16 +115,168 @@ def validate_edit_request(request: ImageEditRequest, images: List[UploadFile]) -
         )
 
 
+# (配置版本, 默认图片格式)
+_default_format_cache: Optional[tuple[int, Optional[str]]] = None
+
+
+def _normalize_response_format(response_format: Optional[str]) -> str:
+    """规范化 response_format；默认格式按配置版本缓存，热更新后自动刷新"""
+    global _default_format_cache
+    version = config_version()
+    cached = _default_format_cache
+    if cached is None or cached[0] != version:
+        cached = (version, get_config("app.image_format"))
+        _default_format_cache = cached
+    return normalize_image_response_format(response_format, default_format=cached[1])
+
+
+# 允许的 Content-Type -> 规范 MIME（顺带把非标准的 image/jpg 归一）
+_CONTENT_TYPE_MIME = {
+    "image/png": "image/png",
+    "image/jpeg": "image/jpeg",
+    "image/jpg": "image/jpeg",
+    "image/webp": "image/webp",
+}
+_IMAGE_EXT_MIME = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+# 3 的倍数：逐块编码时不会在块尾产生 base64 填充，可直接拼接
+_UPLOAD_READ_CHUNK = 3 * 256 * 1024
+
+# 默认用量（只读，仅用于序列化，可在响应间共享）
+_EMPTY_USAGE: Dict[str, Any] = {
+    "total_tokens": 0,
+    "input_tokens": 0,
+    "output_tokens": 0,
+    "input_tokens_details": {"text_tokens": 0, "image_tokens": 0},
+}
+
+
+def _file_too_large() -> ValidationException:
+    return ValidationException(
+        message="Image file too large. Maximum is 50MB.",
+        param="image",
+        code="file_too_large",
+    )
+
+
+async def _read_upload_b64(item: UploadFile, max_bytes: int) -> bytes:
+    """分块读取上传文件并增量编码为 base64，超出大小限制时尽早中止"""
+    # multipart 解析后已知文件大小时，无需读取即可拒绝
+    if item.size is not None and item.size > max_bytes:
+        raise _file_too_large()
+    out = io.BytesIO()
+    carry = b""
+    size = 0
+    while chunk := await item.read(_UPLOAD_READ_CHUNK):
+        size += len(chunk)
+        if size > max_bytes:
+            raise _file_too_large()
+        if carry:
+            chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % 3
+        # 编码放到线程池执行，避免大文件阻塞事件循环
+        out.write(await asyncio.to_thread(b64encode, chunk[:cut]))
+        carry = chunk[cut:]
+    if not size:
+        raise ValidationException(
+            message="File content is empty",
+            param="image",
+            code="empty_file",
+        )
+    if carry:
+        out.write(b64encode(carry))
+    return out.getvalue()
+
+
+def _file_ext(filename: Optional[str]) -> str:
+    """取小写扩展名（含点）；无扩展名返回空串"""
+    name = filename or ""
+    dot = name.rfind(".")
+    return name[dot:].lower() if dot >= 0 else ""
+
+
+def _resolve_upload_mime(item: UploadFile) -> str:
+    mime = _CONTENT_TYPE_MIME.get(
+        (item.content_type or "").lower()
+    ) or _IMAGE_EXT_MIME.get(_file_ext(item.filename))
+    if mime is None:
+        raise ValidationException(
+            message="Unsupported image type. Supported: png, jpg, webp.",
+            param="image",
+            code="invalid_image_type",
+        )
+    return mime
+
+
+async def _prepare_upload(item: UploadFile, max_bytes: int) -> tuple[str, str]:
+    """读取并校验单个上传文件，返回 (mime, base64)"""
+    try:
+        # 类型校验不依赖文件内容，先于读取执行
+        mime = _resolve_upload_mime(item)
+        b64 = await _read_upload_b64(item, max_bytes)
+    finally:
+        await item.close()
+    return mime, b64.decode("ascii")
+
+
+async def _iter_images_json(
+    created: int, response_field: str, images: List[str], usage: Dict[str, Any]
+) -> AsyncIterator[bytes]:
+    """逐张输出图片结果 JSON，避免为多张大图拼出一整块响应体"""
+    yield b'{"created":%d,"data":[' % created
+    # 每项只有一个固定字段：键部分预先编码，逐张只序列化图片字符串，不再为每张图构造临时 dict
+    item_open = b"{" + orjson.dumps(response_field) + b":"
+    item_sep = b"}," + item_open
+    for index, img in enumerate(images):
+        yield item_sep if index else item_open
+        yield orjson.dumps(img)
+    yield (b'}],"usage":' if images else b'],"usage":') + orjson.dumps(usage) + b"}"
+
+
+def _images_response(
+    response_field: str, images: List[str], usage: Dict[str, Any]
+) -> Response:
+    created = time.time_ns() // 1_000_000_000
+    if len(images) > 1:
+        return StreamingResponse(
+            _iter_images_json(created, response_field, images, usage),
+            media_type="application/json",
+        )
+    return ORJSONResponse(
+        content={
+            "created": created,
+            "data": [{response_field: img} for img in images],
+            "usage": usage,
+        }
+    )
+
+
+# X-Accel-Buffering 关闭 nginx 等反向代理的响应缓冲，no-transform 防止中间层改写/压缩事件流
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+_SSE_MEDIA_TYPE = "text/event-stream; charset=utf-8"
+
+
+def _sse_response(stream: AsyncIterator[Union[str, bytes]]) -> StreamingResponse:
+    # 同步迭代器会被 Starlette 放进线程池逐块迭代，服务层必须返回异步生成器
+    if not hasattr(stream, "__aiter__"):
+        raise TypeError("SSE stream must be an async iterator")
+    return StreamingResponse(stream, media_type=_SSE_MEDIA_TYPE, headers=_SSE_HEADERS)
+
+
 async def _get_token(model: str):
     token_mgr = await get_token_manager()
     await token_mgr.reload_if_stale()
 
-    token = None
-    for pool_name in ModelService.pool_candidates_for_model(model):
-        token = token_mgr.get_token(pool_name)
-        if token:
-            break
-
+    token = token_mgr.get_any_token(ModelService.pool_candidates_for_model(model))
     if not token:
         raise AppException(
             message="No available tokens. Please try again later.",
@@ -133,18 +292,10 @@ async def _get_token(model: str):
 async def create_image(request: ImageGenerationRequest):
     if request.stream is None:
         request.stream = False
-    if request.response_format is None:
-        request.response_format = normalize_image_response_format(
-            None,
-            default_format=get_config("app.image_format"),
-        )
-
-    validate_generation_request(request)
-    response_format = normalize_image_response_format(
-        request.response_format,
-        default_format=get_config("app.image_format"),
-    )
+    # 规范化失败与校验失败抛出同一 ValidationException，先规范化再校验只需一次
+    response_format = _normalize_response_format(request.response_format)
     request.response_format = response_format
+    validate_generation_request(request)
     response_field = response_field_name(response_format)
 
     token_mgr, token = await _get_token(request.model or "grok-imagine-1.0")
@@ -152,7 +303,7 @@ async def create_image(request: ImageGenerationRequest):
     size = request.size or "1024x1024"
     aspect_ratio = resolve_aspect_ratio(size)
 
-    result = await ImageGenerationService().generate(
+    result = await _GENERATION_SERVICE.generate(
         token_mgr=token_mgr,
         token=token,
         model_info=model_info,
@@ -165,27 +316,10 @@ async def create_image(request: ImageGenerationRequest):
     )
 
     if result.stream:
-        return StreamingResponse(
-            result.data,
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
-
-    data = [{response_field: img} for img in result.data]
-    usage = result.usage_override or {
-        "total_tokens": 0,
-        "input_tokens": 0,
-        "output_tokens": 0,
-        "input_tokens_details": {"text_tokens": 0, "image_tokens": 0},
-    }
+        return _sse_response(result.data)
 
-    return JSONResponse(
-        content={
-            "created": int(time.time()),
-            "data": data,
-            "usage": usage,
-        }
-    )
+    usage = result.usage_override or _EMPTY_USAGE
+    return _images_response(response_field, result.data, usage)
 
 
 @router.post("/images/edits")
@@ -200,121 +334,55 @@ async def edit_image(
     style: Optional[str] = Form(None),
     stream: Optional[bool] = Form(False),
 ):
-    if response_format is None:
-        response_format = normalize_image_response_format(
-            None,
-            default_format=get_config("app.image_format"),
-        )
+    # 表单字段已由 FastAPI 按签名完成类型转换，这里直接做业务校验
+    model = model or "grok-imagine-1.0-edit"
+    normalized_format = _normalize_response_format(response_format)
+    response_field = response_field_name(normalized_format)
+    validate_edit_request(
+        prompt=prompt,
+        model=model,
+        n=n,
+        stream=bool(stream),
+        response_format=normalized_format,
+        size=size,
+        images=image,
+    )
+
+    # Token 获取与上传文件读取并行
+    token_task = asyncio.create_task(_get_token(model))
 
+    max_image_bytes = 50 * 1024 * 1024
     try:
-        edit_request = ImageEditRequest(
-            prompt=prompt,
-            model=model,
-            n=n,
-            size=size,
-            quality=quality,
-            response_format=response_format,
-            style=style,
-            stream=stream,
+        # 各文件的读取与编码互不依赖，并发处理；任一文件校验失败时异常直接抛出
+        images: List[tuple[str, str]] = list(
+            await asyncio.gather(
+                *(_prepare_upload(item, max_image_bytes) for item in image)
+            )
         )
-    except ValidationError as exc:
-        errors = exc.errors()
-        if errors:
-            first = errors[0]
-            loc = first.get("loc", [])
-            msg = first.get("msg", "Invalid request")
-            code = first.get("type", "invalid_value")
-            param_parts = [
-                str(x) for x in loc if not (isinstance(x, int) or str(x).isdigit())
-            ]
-            param = ".".join(param_parts) if param_parts else None
-            raise ValidationException(message=msg, param=param, code=code)
-        raise ValidationException(message="Invalid request", code="invalid_value")
-
-    if edit_request.stream is None:
-        edit_request.stream = False
-
-    normalized_format = normalize_image_response_format(
-        edit_request.response_format,
-        default_format=get_config("app.image_format"),
-    )
-    edit_request.response_format = normalized_format
-    response_field = response_field_name(normalized_format)
-    validate_edit_request(edit_request, image)
+    except BaseException:
+        token_task.cancel()
+        with contextlib.suppress(BaseException):
+            await token_task
+        raise
 
-    max_image_bytes = 50 * 1024 * 1024
-    allowed_types = {"image/png", "image/jpeg", "image/webp", "image/jpg"}
+    token_mgr, token = await token_task
+    model_info = ModelService.get(model)
 
-    images: List[str] = []
-    for item in image:
-        content = await item.read()
-        await item.close()
-        if not content:
-            raise ValidationException(
-                message="File content is empty",
-                param="image",
-                code="empty_file",
-            )
-        if len(content) > max_image_bytes:
-            raise ValidationException(
-                message="Image file too large. Maximum is 50MB.",
-                param="image",
-                code="file_too_large",
-            )
-        mime = (item.content_type or "").lower()
-        if mime == "image/jpg":
-            mime = "image/jpeg"
-        ext = Path(item.filename or "").suffix.lower()
-        if mime not in allowed_types:
-            if ext in (".jpg", ".jpeg"):
-                mime = "image/jpeg"
-            elif ext == ".png":
-                mime = "image/png"
-            elif ext == ".webp":
-                mime = "image/webp"
-            else:
-                raise ValidationException(
-                    message="Unsupported image type. Supported: png, jpg, webp.",
-                    param="image",
-                    code="invalid_image_type",
-                )
-        b64 = base64.b64encode(content).decode()
-        images.append(f"data:{mime};base64,{b64}")
-
-    token_mgr, token = await _get_token(edit_request.model or "grok-imagine-1.0-edit")
-    model_info = ModelService.get(edit_request.model)
-
-    result = await ImageEditService().edit(
+    result = await _EDIT_SERVICE.edit(
         token_mgr=token_mgr,
         token=token,
         model_info=model_info,
-        prompt=edit_request.prompt,
+        prompt=prompt,
         images=images,
-        n=int(edit_request.n or 1),
+        n=n,
         response_format=normalized_format,
-        stream=bool(edit_request.stream),
+        stream=bool(stream),
     )
 
     if result.stream:
-        return StreamingResponse(
-            result.data,
-            media_type="text/event-stream",
-            headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
-        )
+        return _sse_response(result.data)
 
-    data = [{response_field: img} for img in result.data]
-    return JSONResponse(
-        content={
-            "created": int(time.time()),
-            "data": data,
-            "usage": {
-                "total_tokens": 0,
-                "input_tokens": 0,
-                "output_tokens": 0,
-                "input_tokens_details": {"text_tokens": 0, "image_tokens": 0},
-            },
-        }
-    )
+    return _images_response(response_field, result.data, _EMPTY_USAGE)
 
 
 __all__ = ["router"]
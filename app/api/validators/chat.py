@@ -99,7 +99,6 @@ def _validate_image_config(image_conf: Any, *, stream: bool) -> None:
         stream=stream,
         response_format=getattr(image_conf, "response_format", None),
         size=getattr(image_conf, "size", None),
-        allow_ws_stream=True,
         n_param="image_config.n",
         stream_n_param="image_config.n",
         response_format_param="image_config.response_format",
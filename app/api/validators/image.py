@@ -7,13 +7,15 @@ from typing import Optional
 from app.core.exceptions import ValidationException
 from app.services.grok.services.model import ModelService
 
-ALLOWED_IMAGE_SIZES = {
-    "1280x720",
-    "720x1280",
-    "1792x1024",
-    "1024x1792",
-    "1024x1024",
-}
+ALLOWED_IMAGE_SIZES = frozenset(
+    {
+        "1280x720",
+        "720x1280",
+        "1792x1024",
+        "1024x1792",
+        "1024x1024",
+    }
+)
 
 SIZE_TO_ASPECT = {
     "1280x720": "16:9",
@@ -23,8 +25,14 @@ SIZE_TO_ASPECT = {
     "1024x1024": "1:1",
 }
 
-ALLOWED_ASPECT_RATIOS = {"1:1", "2:3", "3:2", "9:16", "16:9"}
-ALLOWED_RESPONSE_FORMATS = {"b64_json", "base64", "url"}
+ALLOWED_ASPECT_RATIOS = frozenset({"1:1", "2:3", "3:2", "9:16", "16:9"})
+ALLOWED_RESPONSE_FORMATS = frozenset({"b64_json", "base64", "url"})
+
+# 尺寸与规范比例统一映射到比例，常见输入一次查表即可
+_ASPECT_RESOLVE = {
+    **SIZE_TO_ASPECT,
+    **{ratio: ratio for ratio in ALLOWED_ASPECT_RATIOS},
+}
 
 
 def normalize_image_response_format(
@@ -56,7 +64,6 @@ def validate_image_request_common(
     stream: bool,
     response_format: Optional[str],
     size: Optional[str],
-    allow_ws_stream: bool,
     n_param: str,
     stream_n_param: str,
     response_format_param: str,
@@ -69,34 +76,32 @@ def validate_image_request_common(
             code="empty_prompt",
         )
 
-    if n < 1 or n > 10:
+    if not 1 <= n <= 10:
         raise ValidationException(
             message="n must be between 1 and 10",
             param=n_param,
             code="invalid_n",
         )
 
-    if stream and n not in (1, 2):
+    # 此时 n >= 1，只需判断上界
+    if stream and n > 2:
         raise ValidationException(
             message="Streaming is only supported when n=1 or n=2",
             param=stream_n_param,
             code="invalid_stream_n",
         )
 
-    if response_format:
-        value = response_format.strip().lower()
-        if value not in ALLOWED_RESPONSE_FORMATS:
-            raise ValidationException(
-                message="response_format must be one of b64_json, base64, url",
-                param=response_format_param,
-                code="invalid_response_format",
-            )
-        if allow_ws_stream and stream and value not in ALLOWED_RESPONSE_FORMATS:
-            raise ValidationException(
-                message="Streaming only supports response_format=b64_json/base64/url",
-                param=response_format_param,
-                code="invalid_response_format",
-            )
+    # 规范写法直接命中集合，只有非规范输入才做 strip/lower
+    if (
+        response_format
+        and response_format not in ALLOWED_RESPONSE_FORMATS
+        and response_format.strip().lower() not in ALLOWED_RESPONSE_FORMATS
+    ):
+        raise ValidationException(
+            message="response_format must be one of b64_json, base64, url",
+            param=response_format_param,
+            code="invalid_response_format",
+        )
 
     if size and size not in ALLOWED_IMAGE_SIZES:
         raise ValidationException(
@@ -148,10 +153,9 @@ def validate_image_edit_model(model: str) -> None:
 
 def resolve_aspect_ratio(size: str) -> str:
     value = (size or "").strip()
-    if not value:
-        return "2:3"
-    if value in SIZE_TO_ASPECT:
-        return SIZE_TO_ASPECT[value]
+    resolved = _ASPECT_RESOLVE.get(value)
+    if resolved is not None:
+        return resolved
     if ":" in value:
         try:
             left, right = value.split(":", 1)
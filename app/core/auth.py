@@ -2,6 +2,7 @@
 API 认证模块
 """
 
+import hmac
 <<<<<<< HEAD
 import os
 from typing import Optional
@@ -12,7 +13,7 @@ from typing import Optional, Iterable
 from fastapi import HTTPException, status, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.core.config import get_config
+from app.core.config import config_version, get_config
 
 DEFAULT_API_KEY = ""
 DEFAULT_APP_KEY = "grok2api"
@@ -33,6 +34,23 @@ security = HTTPBearer(
     description="Enter your API Key in the format: Bearer <key>",
 )
 
+# 鉴权相关配置项按配置版本缓存，每个请求只需一次版本比较与字典查找
+_auth_config_cache: dict = {}
+_auth_config_version = -1
+
+
+def _auth_config(key: str, default):
+    global _auth_config_version
+    version = config_version()
+    if version != _auth_config_version:
+        _auth_config_cache.clear()
+        _auth_config_version = version
+    try:
+        return _auth_config_cache[key]
+    except KeyError:
+        value = _auth_config_cache[key] = get_config(key, default)
+        return value
+
 
 def get_admin_api_key() -> str:
     """
@@ -40,10 +58,21 @@ def get_admin_api_key() -> str:
 
     为空时表示不启用后台接口认证。
     """
-    api_key = get_config("app.api_key", DEFAULT_API_KEY)
+    api_key = _auth_config("app.api_key", DEFAULT_API_KEY)
     return api_key or ""
 
 
+def secure_compare(provided: Optional[str], expected: str) -> bool:
+    """
+    常量时间比较密钥，避免基于时序的探测。
+
+    按 UTF-8 字节比较，非 ASCII 输入不会触发 compare_digest 的 TypeError。
+    """
+    if provided is None:
+        return False
+    return hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+
+
 <<<<<<< HEAD
 =======
 def _normalize_api_keys(value: Optional[object]) -> list[str]:
@@ -71,7 +100,7 @@ def get_app_key() -> str:
     """
     获取 App Key（后台管理密码）。
     """
-    app_key = get_config("app.app_key", DEFAULT_APP_KEY)
+    app_key = _auth_config("app.app_key", DEFAULT_APP_KEY)
     return app_key or ""
 
 <<<<<<< HEAD
@@ -85,7 +114,7 @@ def get_function_api_key() -> str:
 
     为空时表示不启用功能玩法接口认证。
     """
-    function_key = get_config("app.function_key", DEFAULT_FUNCTION_KEY)
+    function_key = _auth_config("app.function_key", DEFAULT_FUNCTION_KEY)
     return function_key or ""
 
 
@@ -97,7 +126,7 @@ def is_function_enabled() -> bool:
     """
     是否开启功能玩法入口。
     """
-    return bool(get_config("app.function_enabled", DEFAULT_FUNCTION_ENABLED))
+    return bool(_auth_config("app.function_enabled", DEFAULT_FUNCTION_ENABLED))
 
 
 def _match_function_key(credentials: str, function_key: str) -> bool:
@@ -108,14 +137,14 @@ def _match_function_key(credentials: str, function_key: str) -> bool:
     if not normalized:
         return False
     # 常量时间比较，避免基于时序的探测
-    return hmac.compare_digest(credentials, normalized)
+    return secure_compare(credentials, normalized)
 
 
 def is_api_auth_required() -> bool:
     """
     是否启用 API Key 鉴权。
     """
-    return bool(get_config("security.auth_required", DEFAULT_AUTH_REQUIRED))
+    return bool(_auth_config("security.auth_required", DEFAULT_AUTH_REQUIRED))
 
 
 def is_files_public() -> bool:
@@ -123,15 +152,21 @@ def is_files_public() -> bool:
 <<<<<<< HEAD
     文件服务是否允许匿名访问。
     """
-    return bool(get_config("security.files_public", DEFAULT_FILES_PUBLIC))
+    return bool(_auth_config("security.files_public", DEFAULT_FILES_PUBLIC))
+
+
+# 运行环境在进程生命周期内不变，导入时解析一次
+_IS_PRODUCTION = (
+    (os.getenv("APP_ENV") or os.getenv("ENV") or "").strip().lower()
+    in {"prod", "production"}
+)
 
 
 def is_production_env() -> bool:
     """
     检测当前是否生产环境。
     """
-    env = (os.getenv("APP_ENV") or os.getenv("ENV") or "").strip().lower()
-    return env in {"prod", "production"}
+    return _IS_PRODUCTION
 
 
 def _validate_bearer(
@@ -160,7 +195,7 @@ def _validate_bearer(
         )
 
 <<<<<<< HEAD
-    if auth.credentials != expected:
+    if not secure_compare(auth.credentials, expected):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication token",
@@ -169,7 +204,7 @@ def _validate_bearer(
 =======
     # 标准 api_key 验证
     for key in api_keys:
-        if hmac.compare_digest(auth.credentials, key):
+        if secure_compare(auth.credentials, key):
             return auth.credentials
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
 
@@ -238,7 +273,7 @@ async def verify_app_key(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    if not hmac.compare_digest(auth.credentials, app_key):
+    if not secure_compare(auth.credentials, app_key):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication token",
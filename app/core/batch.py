@@ -10,6 +10,8 @@ import time
 import uuid
 from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
 
+import orjson
+
 from app.core.logger import logger
 
 T = TypeVar("T")
@@ -95,6 +97,8 @@ class BatchTask:
         self.created_at = time.time()
         self._queues: List[asyncio.Queue] = []
         self._final_event: Optional[Dict[str, Any]] = None
+        self._final_frame: Optional[bytes] = None
+        self._snapshot_frame: Optional[bytes] = None
         self.cancelled = False
 
     def snapshot(self) -> Dict[str, Any]:
@@ -108,6 +112,15 @@ class BatchTask:
             "warning": self.warning,
         }
 
+    def snapshot_bytes(self) -> bytes:
+        """返回 snapshot 的 SSE 帧，状态未变化时复用同一份序列化结果"""
+        frame = self._snapshot_frame
+        if frame is None:
+            payload = orjson.dumps({"type": "snapshot", **self.snapshot()})
+            frame = b"data: " + payload + b"\n\n"
+            self._snapshot_frame = frame
+        return frame
+
     def attach(self) -> asyncio.Queue:
         q: asyncio.Queue = asyncio.Queue(maxsize=200)
         self._queues.append(q)
@@ -117,10 +130,15 @@ class BatchTask:
         if q in self._queues:
             self._queues.remove(q)
 
-    def _publish(self, event: Dict[str, Any]) -> None:
+    def _publish(self, event: Dict[str, Any], *, final: bool = False) -> None:
+        # 只序列化一次，所有订阅者共享同一份 SSE 帧
+        frame = b"data: " + orjson.dumps(event) + b"\n\n"
+        if final:
+            self._final_event = event
+            self._final_frame = frame
         for q in list(self._queues):
             try:
-                q.put_nowait(event)
+                q.put_nowait(frame)
             except Exception:
                 # Drop if queue is full or closed
                 pass
@@ -128,6 +146,7 @@ class BatchTask:
     def record(
         self, ok: bool, *, item: Any = None, detail: Any = None, error: str = ""
     ) -> None:
+        self._snapshot_frame = None
         self.processed += 1
         if ok:
             self.ok += 1
@@ -151,6 +170,7 @@ class BatchTask:
 
     def finish(self, result: Dict[str, Any], *, warning: Optional[str] = None) -> None:
         self.status = "done"
+        self._snapshot_frame = None
         self.result = result
         self.warning = warning
         event = {
@@ -163,11 +183,11 @@ class BatchTask:
             "warning": self.warning,
             "result": result,
         }
-        self._final_event = event
-        self._publish(event)
+        self._publish(event, final=True)
 
     def fail_task(self, error: str) -> None:
         self.status = "error"
+        self._snapshot_frame = None
         self.error = error
         event = {
             "type": "error",
@@ -178,14 +198,14 @@ class BatchTask:
             "fail": self.fail,
             "error": error,
         }
-        self._final_event = event
-        self._publish(event)
+        self._publish(event, final=True)
 
     def cancel(self) -> None:
         self.cancelled = True
 
     def finish_cancelled(self) -> None:
         self.status = "cancelled"
+        self._snapshot_frame = None
         event = {
             "type": "cancelled",
             "task_id": self.id,
@@ -194,12 +214,14 @@ class BatchTask:
             "ok": self.ok,
             "fail": self.fail,
         }
-        self._final_event = event
-        self._publish(event)
+        self._publish(event, final=True)
 
     def final_event(self) -> Optional[Dict[str, Any]]:
         return self._final_event
 
+    def final_frame(self) -> Optional[bytes]:
+        return self._final_frame
+
 
 _TASKS: Dict[str, BatchTask] = {}
 
@@ -16,6 +16,23 @@ from app.core.logger import logger
 DEFAULT_CONFIG_FILE = Path(__file__).parent.parent.parent / "config.defaults.toml"
 
 
+def _merge_into(target: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """原地深度合并: override 覆盖 target（迭代遍历，不复制 target）."""
+    stack = [(target, override)]
+    while stack:
+        dst, src = stack.pop()
+        for key, val in src.items():
+            current = dst.get(key)
+            if isinstance(val, dict) and isinstance(current, dict):
+                stack.append((current, val))
+            elif isinstance(val, dict):
+                # 复制整棵子树，避免后续原地合并改写 override 本身
+                dst[key] = deepcopy(val)
+            else:
+                dst[key] = val
+    return target
+
+
 def _deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
     """深度合并字典: override 覆盖 base."""
     if not isinstance(base, dict):
@@ -24,13 +41,7 @@ def _deep_merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any
     result = deepcopy(base)
     if not isinstance(override, dict):
         return result
-
-    for key, val in override.items():
-        if isinstance(val, dict) and isinstance(result.get(key), dict):
-            result[key] = _deep_merge(result[key], val)
-        else:
-            result[key] = val
-    return result
+    return _merge_into(result, override)
 
 
 def _migrate_deprecated_config(
@@ -242,6 +253,8 @@ class Config:
 
     def __init__(self):
         self._config = {}
+        # 每次整体替换 _config 时递增，供调用方缓存派生数据
+        self.version = 0
         self._defaults = {}
         self._code_defaults = {}
         self._defaults_loaded = False
@@ -339,11 +352,11 @@ class Config:
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
                 )
 
-            self._config = merged
+            self._replace(merged)
             self._loaded = True
         except Exception as e:
             logger.error(f"Error loading config: {e}")
-            self._config = {}
+            self._replace({})
             self._loaded = False
 
     async def ensure_loaded(self):
@@ -379,8 +392,9 @@ class Config:
         storage = get_storage()
         async with storage.acquire_lock("config_save", timeout=10):
             self._ensure_defaults()
-            base = _deep_merge(self._defaults, self._config or {})
-            merged = _deep_merge(base, new_config or {})
+            # _deep_merge 已返回独立副本，可直接原地合并本次更新
+            merged = _deep_merge(self._defaults, self._config or {})
+            _merge_into(merged, new_config or {})
             merged, removed_items = _prune_unknown_config(merged, self._defaults)
             if removed_items:
                 logger.info(
@@ -388,7 +402,11 @@ class Config:
                     _summarize_removed(removed_items),
                 )
             await storage.save_config(merged)
-            self._config = merged
+            self._replace(merged)
+
+    def _replace(self, data: dict):
+        self._config = data
+        self.version += 1
 
 
 # 全局配置实例
@@ -400,9 +418,14 @@ def get_config(key: str, default: Any = None) -> Any:
     return config.get(key, default)
 
 
+def config_version() -> int:
+    """当前配置版本；配置重新加载或更新后递增"""
+    return config.version
+
+
 def register_defaults(defaults: Dict[str, Any]):
     """注册默认配置"""
     config.register_defaults(defaults)
 
 
-__all__ = ["Config", "config", "get_config", "register_defaults"]
+__all__ = ["Config", "config", "config_version", "get_config", "register_defaults"]
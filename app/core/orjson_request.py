@@ -0,0 +1,37 @@
+"""
+orjson 请求体解析
+
+FastAPI 解析 JSON 请求体时调用 ``Request.json()``（标准库 json），
+这里通过自定义路由类替换为 orjson。
+"""
+
+from typing import Any, Callable, Coroutine
+
+import orjson
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+
+class ORJSONRequest(Request):
+    """使用 orjson 解析请求体的 Request"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError 继承自 json.JSONDecodeError，FastAPI 的错误处理保持不变
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """将请求包装为 ORJSONRequest 的路由类"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request) -> Response:
+            return await handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+
+__all__ = ["ORJSONRequest", "ORJSONRoute"]
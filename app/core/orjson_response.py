@@ -0,0 +1,20 @@
+"""
+orjson JSON 响应
+
+FastAPI 自带的 ORJSONResponse 在新版本中已被标记为废弃，这里提供本地实现。
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """使用 orjson 序列化的 JSON 响应"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+__all__ = ["ORJSONResponse"]
@@ -3,18 +3,19 @@
 """
 
 import asyncio
+import contextlib
 import hashlib
-import math
 import time
-from collections import deque
-from typing import Deque, Dict, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.core.auth import is_production_env
-from app.core.config import get_config
+from app.core.config import config_version, get_config
 from app.core.exceptions import error_response, ErrorType
 from app.core.logger import logger
 
@@ -46,137 +47,275 @@ def _to_float(value, default: float) -> float:
         return default
 
 
-def _extract_ip(request: Request, trust_x_forwarded_for: bool) -> str:
+def _extract_ip(scope: Scope, headers: Headers, trust_x_forwarded_for: bool) -> str:
     if trust_x_forwarded_for:
-        forwarded = request.headers.get("x-forwarded-for", "")
+        forwarded = headers.get("x-forwarded-for", "")
         if forwarded:
-            first = forwarded.split(",")[0].strip()
+            first = forwarded.partition(",")[0].strip()
             if first:
                 return first
-    if request.client and request.client.host:
-        return request.client.host
+    client = scope.get("client")
+    if client and client[0]:
+        return client[0]
     return "unknown"
 
 
-def _extract_client_key(request: Request, trust_x_forwarded_for: bool) -> str:
-    auth = (request.headers.get("authorization") or "").strip()
+# 同一 API Key 会被反复使用，缓存摘要；限定容量避免无限增长
+@lru_cache(maxsize=4096)
+def _token_fingerprint(token: str) -> str:
+    return "ak:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def _extract_client_key(scope: Scope, trust_x_forwarded_for: bool) -> str:
+    headers = Headers(scope=scope)
+    auth = (headers.get("authorization") or "").strip()
     if auth.lower().startswith("bearer "):
         token = auth[7:].strip()
         if token:
-            digest = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
-            return f"ak:{digest}"
-    return f"ip:{_extract_ip(request, trust_x_forwarded_for)}"
-
-
-def _resolve_path_limit(path: str, route_limits: dict, default_limit: int) -> int:
+            return _token_fingerprint(token)
+    return f"ip:{_extract_ip(scope, headers, trust_x_forwarded_for)}"
+
+
+@dataclass(frozen=True)
+class _RateLimitSettings:
+    """限流配置快照，按配置版本缓存"""
+
+    enabled: bool
+    include_prefixes: Tuple[str, ...]
+    exclude_prefixes: Tuple[str, ...]
+    default_limit: int
+    window_seconds: float
+    # 精确路径 -> 限额
+    exact_limits: Dict[str, int]
+    # (前缀, 限额)，按前缀长度降序，首个命中即最长前缀
+    prefix_limits: Tuple[Tuple[str, int], ...]
+    trust_xff: bool
+
+
+def _compile_route_limits(
+    route_limits: Any, default_limit: int
+) -> Tuple[Dict[str, int], Tuple[Tuple[str, int], ...]]:
+    """将 route_limits 预解析为精确表与按长度降序的前缀表"""
     if not isinstance(route_limits, dict):
-        return default_limit
-
-    exact = route_limits.get(path)
-    if exact is not None:
-        return max(0, _to_int(exact, default_limit))
-
-    best = None
-    best_len = -1
+        return {}, ()
+    exact: Dict[str, int] = {}
+    prefixes: List[Tuple[str, int]] = []
     for pattern, value in route_limits.items():
-        if not isinstance(pattern, str) or not pattern.endswith("*"):
+        if not isinstance(pattern, str):
             continue
-        prefix = pattern[:-1]
-        if path.startswith(prefix) and len(prefix) > best_len:
-            best_len = len(prefix)
-            best = value
-
-    if best is None:
-        return default_limit
-    return max(0, _to_int(best, default_limit))
+        limit = max(0, _to_int(value, default_limit))
+        exact[pattern] = limit
+        if pattern.endswith("*"):
+            prefixes.append((pattern[:-1], limit))
+    # sort 稳定，等长前缀保持配置顺序（与原先线性扫描一致）
+    prefixes.sort(key=lambda item: -len(item[0]))
+    return exact, tuple(prefixes)
+
+
+# (配置版本, 快照)
+_settings_cache: Optional[Tuple[int, _RateLimitSettings]] = None
+
+
+def _load_settings() -> _RateLimitSettings:
+    global _settings_cache
+    version = config_version()
+    cached = _settings_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    enabled = bool(get_config("rate_limit.enabled", False))
+    if not enabled and is_production_env():
+        enabled = bool(get_config("rate_limit.enabled_in_production", True))
+    default_limit = max(
+        1, _to_int(get_config("rate_limit.default_limit_per_window", 120), 120)
+    )
+    exact_limits, prefix_limits = _compile_route_limits(
+        get_config("rate_limit.route_limits", {}), default_limit
+    )
+    settings = _RateLimitSettings(
+        enabled=enabled,
+        include_prefixes=tuple(
+            _as_list(
+                get_config("rate_limit.include_prefixes", DEFAULT_INCLUDE_PREFIXES),
+                DEFAULT_INCLUDE_PREFIXES,
+            )
+        ),
+        exclude_prefixes=tuple(
+            _as_list(
+                get_config("rate_limit.exclude_prefixes", DEFAULT_EXCLUDE_PREFIXES),
+                DEFAULT_EXCLUDE_PREFIXES,
+            )
+        ),
+        default_limit=default_limit,
+        window_seconds=max(
+            1.0, _to_float(get_config("rate_limit.window_seconds", 60), 60.0)
+        ),
+        exact_limits=exact_limits,
+        prefix_limits=prefix_limits,
+        trust_xff=bool(get_config("rate_limit.trust_x_forwarded_for", False)),
+    )
+    _settings_cache = (version, settings)
+    return settings
+
+
+def _resolve_path_limit(path: str, settings: _RateLimitSettings) -> int:
+    exact = settings.exact_limits.get(path)
+    if exact is not None:
+        return exact
+    for prefix, limit in settings.prefix_limits:
+        if path.startswith(prefix):
+            return limit
+    return settings.default_limit
 
 
 class _SlidingWindowLimiter:
-    def __init__(self):
-        self._buckets: Dict[str, Deque[float]] = {}
-        self._lock = asyncio.Lock()
+    """
+    双计数器滑动窗口限流
 
-    async def allow(self, key: str, limit: int, window_seconds: float) -> Tuple[bool, float]:
-        now = time.monotonic()
-        cutoff = now - window_seconds
+    每个 key 只保存 [上一窗口计数, 当前窗口计数, 当前窗口起点]，
+    以上一窗口计数按剩余比例加权估算滑动窗口内的请求数，内存与耗时均为 O(1)。
+    allow 是同步方法，在事件循环中天然原子执行，不需要加锁或 CAS 重试。
+    过期 key 由后台任务按窗口周期分批清理，不占用请求路径。
+    """
 
-        async with self._lock:
-            bucket = self._buckets.get(key)
-            if bucket is None:
-                bucket = deque()
-                self._buckets[key] = bucket
+    _SWEEP_BATCH = 500
 
-            while bucket and bucket[0] <= cutoff:
-                bucket.popleft()
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+        self._window_seconds = 60.0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def _ensure_sweeper(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        sweeper = self._sweeper
+        # 旧事件循环关闭后其任务不会再结束，只复用属于当前循环的任务
+        if sweeper is not None and not sweeper.done() and sweeper.get_loop() is loop:
+            return
+        self._sweeper = loop.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self) -> None:
+        """取消后台清理任务（应用关闭时调用）"""
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is None or sweeper.done():
+            return
+        if sweeper.get_loop() is not asyncio.get_running_loop():
+            return
+        sweeper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await sweeper
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            window_seconds = self._window_seconds
+            await asyncio.sleep(window_seconds)
+            stale_cutoff = time.monotonic() - (window_seconds * 2)
+            buckets = self._buckets
+            for index, bucket_key in enumerate(list(buckets), 1):
+                state = buckets.get(bucket_key)
+                if state is not None and state[2] < stale_cutoff:
+                    del buckets[bucket_key]
+                # 分批让出事件循环，避免 key 很多时阻塞请求
+                if index % self._SWEEP_BATCH == 0:
+                    await asyncio.sleep(0)
+
+    def allow(self, key: str, limit: int, window_seconds: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self._window_seconds = window_seconds
+        self._ensure_sweeper()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [0, 0, now]
+            self._buckets[key] = bucket
+
+        elapsed = now - bucket[2]
+        if elapsed >= window_seconds:
+            # 跨过一个窗口：当前计数转为上一窗口；跨过两个及以上则全部清零
+            bucket[0] = bucket[1] if elapsed < window_seconds * 2 else 0
+            bucket[1] = 0
+            elapsed %= window_seconds
+            bucket[2] = now - elapsed
+
+        prev, curr = bucket[0], bucket[1]
+        weight = 1.0 - elapsed / window_seconds
+        if prev * weight + curr >= limit:
+            if curr >= limit:
+                # 需等到下一窗口，且上一窗口（即本窗口）的加权值降到阈值以下
+                retry_after = (window_seconds - elapsed) + window_seconds * (
+                    1.0 - limit / curr
+                )
+            else:
+                retry_after = window_seconds * (1.0 - (limit - curr) / prev) - elapsed
+            return False, max(0.0, retry_after)
+
+        bucket[1] = curr + 1
+        return True, 0.0
 
-            if len(bucket) >= limit:
-                retry_after = max(0.0, window_seconds - (now - bucket[0]))
-                return False, retry_after
 
-            bucket.append(now)
+_LIMITER = _SlidingWindowLimiter()
 
-            # 惰性清理，避免 key 无限增长
-            if len(self._buckets) > 20000:
-                stale_cutoff = now - (window_seconds * 2)
-                stale_keys = [
-                    bucket_key
-                    for bucket_key, times in self._buckets.items()
-                    if not times or times[-1] < stale_cutoff
-                ]
-                for bucket_key in stale_keys:
-                    self._buckets.pop(bucket_key, None)
 
-            return True, 0.0
+async def stop_rate_limit_sweeper() -> None:
+    """停止限流器的过期 key 清理任务"""
+    await _LIMITER.stop_sweeper()
 
 
-_LIMITER = _SlidingWindowLimiter()
+class RequestRateLimitMiddleware:
+    """
+    入口限流中间件
 
+    纯 ASGI 实现，直接从 scope 读取 path/method/headers，
+    避免 BaseHTTPMiddleware 的额外任务与流转发开销
+    """
 
-class RequestRateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            return await call_next(request)
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-        enabled = bool(get_config("rate_limit.enabled", False))
-        if not enabled and is_production_env():
-            enabled = bool(get_config("rate_limit.enabled_in_production", True))
-        if not enabled:
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
 
-        path = request.url.path
-        include_prefixes = _as_list(
-            get_config("rate_limit.include_prefixes", DEFAULT_INCLUDE_PREFIXES),
-            DEFAULT_INCLUDE_PREFIXES,
-        )
-        exclude_prefixes = _as_list(
-            get_config("rate_limit.exclude_prefixes", DEFAULT_EXCLUDE_PREFIXES),
-            DEFAULT_EXCLUDE_PREFIXES,
-        )
+        settings = _load_settings()
+        if not settings.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        include_prefixes = settings.include_prefixes
+        exclude_prefixes = settings.exclude_prefixes
 
-        if include_prefixes and not any(path.startswith(prefix) for prefix in include_prefixes):
-            return await call_next(request)
-        if exclude_prefixes and any(path.startswith(prefix) for prefix in exclude_prefixes):
-            return await call_next(request)
+        # str.startswith 接受元组，在 C 层完成逐个前缀比较
+        if (include_prefixes and not path.startswith(include_prefixes)) or (
+            exclude_prefixes and path.startswith(exclude_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
 
-        default_limit = max(1, _to_int(get_config("rate_limit.default_limit_per_window", 120), 120))
-        window_seconds = max(1.0, _to_float(get_config("rate_limit.window_seconds", 60), 60.0))
-        route_limits = get_config("rate_limit.route_limits", {})
-        limit = _resolve_path_limit(path, route_limits, default_limit)
+        window_seconds = settings.window_seconds
+        limit = _resolve_path_limit(path, settings)
         if limit <= 0:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
-        trust_xff = bool(get_config("rate_limit.trust_x_forwarded_for", False))
-        client_key = _extract_client_key(request, trust_xff)
-        bucket_key = f"{request.method}:{path}:{client_key}"
+        method = scope["method"]
+        client_key = _extract_client_key(scope, settings.trust_xff)
+        bucket_key = f"{method}:{path}:{client_key}"
 
-        allowed, retry_after = await _LIMITER.allow(bucket_key, limit, window_seconds)
+        allowed, retry_after = _LIMITER.allow(bucket_key, limit, window_seconds)
         if allowed:
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
-        retry_after_seconds = max(1, int(math.ceil(retry_after)))
-        trace_id = getattr(request.state, "trace_id", None)
+        # retry_after 非负，整数运算向上取整，至少 1 秒
+        whole = int(retry_after)
+        retry_after_seconds = max(1, whole + (retry_after > whole))
+        trace_id = scope.get("state", {}).get("trace_id")
         blocked_logger = logger.bind(
-            method=request.method,
+            method=method,
             path=path,
             client=client_key,
             limit=limit,
@@ -187,16 +326,14 @@ class RequestRateLimitMiddleware(BaseHTTPMiddleware):
             blocked_logger = blocked_logger.bind(traceID=trace_id)
         blocked_logger.warning("Request blocked by global rate limiter")
 
-        headers = {"Retry-After": str(retry_after_seconds)}
-        if trace_id:
-            headers["X-Trace-Id"] = trace_id
-
-        return JSONResponse(
+        # X-Trace-Id 由外层 ResponseLoggerMiddleware 统一追加
+        response = JSONResponse(
             status_code=429,
-            headers=headers,
+            headers={"Retry-After": str(retry_after_seconds)},
             content=error_response(
                 message="Rate limit exceeded. Please retry later.",
                 error_type=ErrorType.RATE_LIMIT.value,
                 code="rate_limit_exceeded",
             ),
         )
+        await response(scope, receive, send)
@@ -5,12 +5,14 @@ Response Middleware
 用于记录请求日志、生成 TraceID 和计算请求耗时
 """
 
+import re
 import time
 import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from typing import FrozenSet, Iterable, Optional, Tuple
 
-from app.core.config import get_config
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config_version, get_config
 from app.core.logger import logger
 
 DEFAULT_IGNORE_PATHS = [
@@ -37,68 +39,143 @@ def _as_list(value, default):
     return list(default)
 
 
+# (配置版本, 忽略路径集合, 忽略前缀)
+_ignore_cache: Optional[Tuple[int, FrozenSet[str], Tuple[str, ...]]] = None
+
+
+def _ignore_rules() -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+    global _ignore_cache
+    version = config_version()
+    cached = _ignore_cache
+    if cached is None or cached[0] != version:
+        ignore_paths_raw = get_config("logging.ignore_paths", DEFAULT_IGNORE_PATHS)
+        ignore_prefixes_raw = get_config(
+            "logging.ignore_prefixes", DEFAULT_IGNORE_PREFIXES
+        )
+        cached = (
+            version,
+            frozenset(_as_list(ignore_paths_raw, DEFAULT_IGNORE_PATHS)),
+            tuple(_as_list(ignore_prefixes_raw, DEFAULT_IGNORE_PREFIXES)),
+        )
+        _ignore_cache = cached
+    return cached[1], cached[2]
+
+
 def _should_skip_logging(path: str) -> bool:
-    ignore_paths_raw = get_config("logging.ignore_paths", DEFAULT_IGNORE_PATHS)
-    ignore_paths = set(_as_list(ignore_paths_raw, DEFAULT_IGNORE_PATHS))
-    ignore_prefixes = _as_list(
-        get_config("logging.ignore_prefixes", DEFAULT_IGNORE_PREFIXES),
-        DEFAULT_IGNORE_PREFIXES,
-    )
+    ignore_paths, ignore_prefixes = _ignore_rules()
     if path in ignore_paths:
         return True
-    return any(path.startswith(prefix) for prefix in ignore_prefixes)
+    return path.startswith(ignore_prefixes)
+
 
+# 上游请求 ID 会写入日志与响应头，只接受长度受限的简单标识，其余一律重新生成
+_TRACE_ID_PATTERN = re.compile(rb"[A-Za-z0-9._-]{1,128}")
 
-class ResponseLoggerMiddleware(BaseHTTPMiddleware):
+
+def _valid_trace_id(value: Optional[bytes]) -> Optional[bytes]:
+    if value is not None and _TRACE_ID_PATTERN.fullmatch(value):
+        return value
+    return None
+
+
+def _incoming_trace_id(raw_headers: Iterable[Tuple[bytes, bytes]]) -> Optional[bytes]:
+    """取上游传入的合法 X-Request-Id（优先）或 X-Trace-Id，保持原始字节"""
+    request_id = trace_id = None
+    for name, value in raw_headers:
+        if name == b"x-request-id":
+            if request_id is None:
+                request_id = value
+        elif name == b"x-trace-id":
+            if trace_id is None:
+                trace_id = value
+    return _valid_trace_id(request_id) or _valid_trace_id(trace_id)
+
+
+def _with_trace_header(message: Message, trace_header: Tuple[bytes, bytes]) -> None:
+    # 新建列表而不是原地追加，避免污染可能被复用的 Response.raw_headers
+    message["headers"] = [*message.get("headers", ()), trace_header]
+
+
+class ResponseLoggerMiddleware:
     """
     请求日志/响应追踪中间件
     Request Logging and Response Tracking Middleware
+
+    纯 ASGI 实现，直接从 scope 读取请求信息，避免 BaseHTTPMiddleware 的额外任务与流转发开销
     """
 
-    async def dispatch(self, request: Request, call_next):
-        # 生成请求 ID
-        trace_id = str(uuid.uuid4())
-        request.state.trace_id = trace_id
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
 
-        start_time = time.time()
-        path = request.url.path
-        request_logger = logger.bind(
-            traceID=trace_id,
-            method=request.method,
-            path=path,
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 优先沿用上游传入的请求 ID，否则生成；响应头直接使用字节，无需逐次编码
+        trace_bytes = (
+            _incoming_trace_id(scope["headers"])
+            or uuid.uuid4().hex.encode("ascii")
         )
+        trace_header = (b"x-trace-id", trace_bytes)
+        trace_id = trace_bytes.decode("latin-1")
+        scope.setdefault("state", {})["trace_id"] = trace_id
 
-        if _should_skip_logging(path):
-            response = await call_next(request)
-            response.headers["X-Trace-Id"] = trace_id
-            return response
+        start_time = time.perf_counter()
+        path = scope["path"]
 
-        # 记录请求信息
-        request_logger.info(f"Request: {request.method} {path}")
+        if _should_skip_logging(path):
 
-        try:
-            response = await call_next(request)
+            async def send_with_trace(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    _with_trace_header(message, trace_header)
+                await send(message)
 
-            # 计算耗时
-            duration = (time.time() - start_time) * 1000
-            response.headers["X-Trace-Id"] = trace_id
+            await self.app(scope, receive, send_with_trace)
+            return
 
-            # 记录响应信息
-            request_logger.bind(
-                status=response.status_code,
-                duration_ms=round(duration, 2),
-            ).info(
-                f"Response: {request.method} {path} - {response.status_code} ({duration:.2f}ms)"
-            )
+        method = scope["method"]
+        request_logger = logger.bind(
+            traceID=trace_id,
+            method=method,
+            path=path,
+        )
 
-            return response
+        # 记录请求信息
+        request_logger.info("Request: {} {}", method, path)
+
+        async def send_with_log(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # 计算耗时（到响应头发出为止）
+                duration = (time.perf_counter() - start_time) * 1000
+                _with_trace_header(message, trace_header)
+                status_code = message["status"]
+
+                # 记录响应信息；关键字参数直接并入 extra，无需再 bind 一次
+                # 路径等作为位置参数传入，避免其中的花括号被当作格式占位符
+                request_logger.info(
+                    "Response: {} {} - {} ({:.2f}ms)",
+                    method,
+                    path,
+                    status_code,
+                    duration,
+                    status=status_code,
+                    duration_ms=round(duration, 2),
+                )
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_with_log)
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
-            request_logger.bind(
+            duration = (time.perf_counter() - start_time) * 1000
+            error = str(e)
+            request_logger.error(
+                "Response Error: {} {} - {} ({:.2f}ms)",
+                method,
+                path,
+                error,
+                duration,
                 duration_ms=round(duration, 2),
-                error=str(e),
-            ).error(
-                f"Response Error: {request.method} {path} - {str(e)} ({duration:.2f}ms)"
+                error=error,
             )
             raise e
@@ -419,17 +419,17 @@ class ImageWSBaseProcessor(BaseProcessor):
     def _strip_base64(self, blob: str) -> str:
         if not blob:
             return ""
-        if "," in blob and "base64" in blob.split(",", 1)[0]:
-            return blob.split(",", 1)[1]
+        header, sep, data = blob.partition(",")
+        if sep and "base64" in header:
+            return data
         return blob
 
     def _guess_ext(self, blob: str) -> Optional[str]:
         if not blob:
             return None
-        header = ""
-        data = blob
-        if "," in blob and "base64" in blob.split(",", 1)[0]:
-            header, data = blob.split(",", 1)
+        header, sep, data = blob.partition(",")
+        if not (sep and "base64" in header):
+            header, data = "", blob
         header = header.lower()
         if "image/png" in header:
             return "png"
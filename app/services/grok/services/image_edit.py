@@ -8,7 +8,7 @@ import random
 import re
 import time
 from dataclasses import dataclass
-from typing import AsyncGenerator, AsyncIterable, List, Union, Any
+from typing import AsyncGenerator, AsyncIterable, List, Tuple, Union, Any
 
 import orjson
 from curl_cffi.requests.errors import RequestsError
@@ -53,7 +53,7 @@ class ImageEditService:
         token: str,
         model_info: Any,
         prompt: str,
-        images: List[str],
+        images: List[Union[str, Tuple[str, str]]],
         n: int,
         response_format: str,
         stream: bool,
@@ -177,7 +177,9 @@ class ImageEditService:
             status_code=429,
         )
 
-    async def _upload_images(self, images: List[str], token: str) -> List[str]:
+    async def _upload_images(
+        self, images: List[Union[str, Tuple[str, str]]], token: str
+    ) -> List[str]:
         image_urls: List[str] = []
         upload_service = UploadService()
         try:
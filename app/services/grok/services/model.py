@@ -3,7 +3,7 @@ Grok 模型管理服务
 """
 
 from enum import Enum
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple
 from pydantic import BaseModel, Field
 
 from app.core.exceptions import ValidationException
@@ -38,6 +38,11 @@ class ModelInfo(BaseModel):
     is_video: bool = False
 
 
+# 候选池顺序固定，返回共享的不可变元组
+_SUPER_POOL_CANDIDATES: Tuple[str, ...] = ("ssoSuper",)
+_BASIC_POOL_CANDIDATES: Tuple[str, ...] = ("ssoBasic", "ssoSuper")
+
+
 class ModelService:
     """模型管理服务"""
 
@@ -247,13 +252,13 @@ class ModelService:
         return "ssoBasic"
 
     @classmethod
-    def pool_candidates_for_model(cls, model_id: str) -> List[str]:
+    def pool_candidates_for_model(cls, model_id: str) -> Tuple[str, ...]:
         """按优先级返回可用 Token 池列表"""
         model = cls.get(model_id)
         if model and model.tier == Tier.SUPER:
-            return ["ssoSuper"]
+            return _SUPER_POOL_CANDIDATES
         # 基础模型优先使用 basic 池，缺失时可回退到 super 池
-        return ["ssoBasic", "ssoSuper"]
+        return _BASIC_POOL_CANDIDATES
 
 
 __all__ = ["ModelService"]
@@ -9,7 +9,7 @@ import hashlib
 import mimetypes
 import re
 from pathlib import Path
-from typing import AsyncIterator, Optional, Tuple
+from typing import AsyncIterator, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import aiofiles
@@ -229,19 +229,27 @@ class UploadService:
 
         raise ValidationException("Invalid file input: must be URL or base64")
 
-    async def upload_file(self, file_input: str, token: str) -> Tuple[str, str]:
+    async def upload_file(
+        self, file_input: Union[str, Tuple[str, str]], token: str
+    ) -> Tuple[str, str]:
         """
         Upload file to Grok.
 
         Args:
-            file_input: str, the file input.
+            file_input: URL / data URI, or an already encoded (mime, base64) pair.
             token: str, the SSO token.
 
         Returns:
             Tuple[str, str]: The file ID and URI.
         """
         async with _get_upload_semaphore():
-            filename, b64, mime = await self.check_format(file_input)
+            if isinstance(file_input, tuple):
+                # Pre-encoded upload: skip building and re-parsing a data URI.
+                mime, b64 = file_input
+                ext = mime.split("/")[-1] if "/" in mime else "bin"
+                filename = f"file.{ext}"
+            else:
+                filename, b64, mime = await self.check_format(file_input)
 
             logger.debug(
                 f"Upload prepare: filename={filename}, type={mime}, size={len(b64)}"
@@ -18,13 +18,13 @@ def normalize_proxies(proxies: Optional[Dict[str, str]]) -> Optional[Dict[str, s
     return out or None
 
 
-def _proxy_enabled(proxies: Optional[Dict[str, str]]) -> bool:
-    return normalize_proxies(proxies) is not None
-
-
 def is_tls_proxy_impersonation_error(error: Exception) -> bool:
     """Detect curl_cffi TLS failures caused by proxy+impersonate incompatibility."""
-    msg = str(error).lower()
+    raw = str(error)
+    # "(35)" is case-independent: most errors bail out here without a lowered copy.
+    if "(35)" not in raw:
+        return False
+    msg = raw.lower()
     return (
         "curl: (35)" in msg
         and "tls connect error" in msg
@@ -33,11 +33,18 @@ def is_tls_proxy_impersonation_error(error: Exception) -> bool:
 
 
 def should_retry_without_impersonate(
-    error: Exception, browser: Optional[str], proxies: Optional[Dict[str, str]]
+    error: Exception,
+    browser: Optional[str],
+    proxies: Optional[Dict[str, str]],
+    *,
+    proxies_enabled: Optional[bool] = None,
 ) -> bool:
+    """proxies_enabled: caller already normalized proxies; skip re-normalizing."""
     if not browser:
         return False
-    if not _proxy_enabled(proxies):
+    if proxies_enabled is None:
+        proxies_enabled = normalize_proxies(proxies) is not None
+    if not proxies_enabled:
         return False
     return is_tls_proxy_impersonation_error(error)
 
@@ -57,29 +64,31 @@ async def request_with_impersonation_fallback(
     when a known proxy TLS compatibility error is hit.
     """
     request_fn = getattr(session, method)
-    proxies = normalize_proxies(proxies)
+    norm_proxies = normalize_proxies(proxies)
     try:
         if browser:
             return await request_fn(
                 url,
-                proxies=proxies,
+                proxies=norm_proxies,
                 impersonate=browser,
                 **kwargs,
             )
         return await request_fn(
             url,
-            proxies=proxies,
+            proxies=norm_proxies,
             **kwargs,
         )
     except Exception as e:
-        if should_retry_without_impersonate(e, browser, proxies):
+        if should_retry_without_impersonate(
+            e, browser, norm_proxies, proxies_enabled=norm_proxies is not None
+        ):
             logger.warning(
                 f"{log_prefix}: proxy TLS incompatibility with impersonate='{browser}', "
                 "retrying once without impersonate"
             )
             return await request_fn(
                 url,
-                proxies=proxies,
+                proxies=norm_proxies,
                 **kwargs,
             )
         raise
@@ -3,7 +3,7 @@
 import asyncio
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Sequence, Set
 
 from app.core.logger import logger
 from app.services.token.models import (
@@ -27,6 +27,7 @@ DEFAULT_REFRESH_CONCURRENCY = 5
 DEFAULT_SUPER_REFRESH_INTERVAL_HOURS = 2
 DEFAULT_REFRESH_INTERVAL_HOURS = 8
 DEFAULT_RELOAD_INTERVAL_SEC = 30
+RELOAD_CHECK_DEBOUNCE_SEC = 0.5
 DEFAULT_SAVE_DELAY_MS = 500
 DEFAULT_USAGE_FLUSH_INTERVAL_SEC = 5
 <<<<<<< HEAD
@@ -59,6 +60,7 @@ class TokenManager:
         self._save_task: Optional[asyncio.Task] = None
         self._save_delay = DEFAULT_SAVE_DELAY_MS / 1000.0
         self._last_reload_at = 0.0
+        self._last_reload_check = 0.0
         self._has_state_changes = False
         self._has_usage_changes = False
         self._state_change_seq = 0
@@ -177,6 +179,11 @@ class TokenManager:
 
     async def reload_if_stale(self):
         """在多 worker 场景下保持短周期一致性"""
+        # 短时间内的重复检查直接跳过，也避免并发请求同时排队重载
+        now = time.monotonic()
+        if now - self._last_reload_check < RELOAD_CHECK_DEBOUNCE_SEC:
+            return
+        self._last_reload_check = now
         interval = get_config("token.reload_interval_sec", DEFAULT_RELOAD_INTERVAL_SEC)
         try:
             interval = float(interval)
@@ -184,7 +191,7 @@ class TokenManager:
             interval = float(DEFAULT_RELOAD_INTERVAL_SEC)
         if interval <= 0:
             return
-        if time.monotonic() - self._last_reload_at < interval:
+        if now - self._last_reload_at < interval:
             return
         await self.reload()
 
@@ -375,7 +382,7 @@ class TokenManager:
             if self._dirty:
                 self._schedule_save()
 
-    def get_token(self, pool_name: str = "ssoBasic", exclude: set = None, prefer_tags: Optional[Set[str]] = None) -> Optional[str]:
+    def get_token(self, pool_name: str = "ssoBasic", exclude: Optional[Set[str]] = None, prefer_tags: Optional[Set[str]] = None) -> Optional[str]:
         """
         获取可用 Token
 
@@ -401,6 +408,19 @@ class TokenManager:
             return token[4:]
         return token
 
+    def get_any_token(
+        self,
+        pool_names: Sequence[str],
+        exclude: Optional[Set[str]] = None,
+        prefer_tags: Optional[Set[str]] = None,
+    ) -> Optional[str]:
+        """按顺序从候选池中获取第一个可用 Token"""
+        for pool_name in pool_names:
+            token = self.get_token(pool_name, exclude=exclude, prefer_tags=prefer_tags)
+            if token:
+                return token
+        return None
+
     def get_token_info(self, pool_name: str = "ssoBasic", prefer_tags: Optional[Set[str]] = None) -> Optional["TokenInfo"]:
         """
         获取可用 Token 的完整信息
@@ -427,7 +447,7 @@ class TokenManager:
         self,
         resolution: str = "480p",
         video_length: int = 6,
-        pool_candidates: Optional[List[str]] = None,
+        pool_candidates: Optional[Sequence[str]] = None,
     ) -> Optional["TokenInfo"]:
         """
         根据视频需求智能选择 Token 池
@@ -40,6 +40,7 @@ from app.core.auth import verify_api_key  # noqa: E402
 from app.core.config import config, get_config  # noqa: E402
 >>>>>>> 635e6e3524c5f54f26cd693b8bf42d64f031503b
 from app.core.logger import logger, setup_logging  # noqa: E402
+from app.core.orjson_response import ORJSONResponse  # noqa: E402
 from app.core.exceptions import register_exception_handlers  # noqa: E402
 from app.core.rate_limit_middleware import RequestRateLimitMiddleware  # noqa: E402
 from app.core.response_middleware import ResponseLoggerMiddleware  # noqa: E402
@@ -152,6 +153,9 @@ async def lifespan(app: FastAPI):
     from app.services.cf_refresh import stop as cf_refresh_stop
     cf_refresh_stop()
 
+    from app.core.rate_limit_middleware import stop_rate_limit_sweeper
+    await stop_rate_limit_sweeper()
+
     from app.core.storage import StorageFactory
 
     if StorageFactory._instance:
@@ -167,6 +171,7 @@ def create_app() -> FastAPI:
     app = FastAPI(
         title="Grok2API",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
     )
 
     cors_allow_origins = _env_list("CORS_ALLOW_ORIGINS", ["*"])
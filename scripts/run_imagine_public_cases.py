@@ -1,19 +1,49 @@
+import contextlib
 import json
+import re
 import threading
 import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
-import requests
+import urllib3
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so one except covers both.
+    _loads = orjson.loads
+    _encode = orjson.dumps
+
+    def _dumps(obj: Any) -> str:
+        # orjson writes non-ASCII as-is, matching ensure_ascii=False.
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+
+except ImportError:
+    _loads = json.loads
+
+    def _encode(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
 
 BASE_URL = "http://127.0.0.1:8000"
-START_URL = f"{BASE_URL}/v1/public/imagine/start"
-SSE_URL = f"{BASE_URL}/v1/public/imagine/sse"
-STOP_URL = f"{BASE_URL}/v1/public/imagine/stop"
+START_PATH = "/v1/public/imagine/start"
+SSE_PATH = "/v1/public/imagine/sse"
+STOP_PATH = "/v1/public/imagine/stop"
 MAX_WAIT_SECONDS = 180
+ACCEPT_HEADERS = {"Accept": "application/json"}
+JSON_HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
+# Server task ids are opaque hex/uuid-like tokens; those can be spliced into the stop body verbatim.
+_PLAIN_TASK_ID = re.compile(r"[A-Za-z0-9_-]+")
+SSE_TIMEOUT = urllib3.Timeout(connect=10, read=120)
 
 
-@dataclass
+@dataclass(slots=True)
 class CaseResult:
     case: str
     status: str = "pending"
@@ -25,52 +55,165 @@ class CaseResult:
 
 
 class SharedState:
+    __slots__ = ("lock", "cv", "running_seen", "round_done_seen", "stopped_seen")
+
     def __init__(self) -> None:
         self.lock = threading.Lock()
+        # Signalled on every state transition so run_case sleeps until something changes.
+        self.cv = threading.Condition(self.lock)
         self.running_seen = False
         self.round_done_seen = 0
         self.stopped_seen = False
 
 
-def create_task(session: requests.Session, payload: Dict[str, Any]) -> str:
-    resp = session.post(START_URL, json=payload, timeout=20)
-    resp.raise_for_status()
-    data = resp.json()
+def build_pool() -> urllib3.HTTPConnectionPool:
+    # One keep-alive pool for the fixed host, shared by the long-lived SSE reads and the
+    # start/stop POSTs. Talking to urllib3 directly skips the Session, adapter and hook
+    # machinery of requests, which this cookie-free control traffic never uses.
+    base = urllib3.util.parse_url(BASE_URL)
+    return urllib3.HTTPConnectionPool(
+        base.host,
+        base.port,
+        maxsize=32,
+        block=False,
+        retries=Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "POST"]),
+        ),
+    )
+
+
+def _preview(data: bytes) -> str:
+    return data[:300].decode("utf-8", errors="replace")
+
+
+def create_task(pool: urllib3.HTTPConnectionPool, body: bytes) -> str:
+    # body is pre-encoded JSON.
+    resp = pool.urlopen("POST", START_PATH, body=body, headers=JSON_HEADERS, timeout=20)
+    if resp.status >= 400:
+        raise RuntimeError(f"start failed: HTTP {resp.status} {_preview(resp.data)}")
+    data = _loads(resp.data)
     task_id = str(data.get("task_id") or "").strip()
     if not task_id:
         raise RuntimeError(f"start missing task_id: {data}")
     return task_id
 
 
-def stop_task(session: requests.Session, task_id: str, errors: List[str]) -> None:
+def _stop_body(task_id: str) -> bytes:
+    if _PLAIN_TASK_ID.fullmatch(task_id):
+        return b'{"task_ids":["' + task_id.encode("ascii") + b'"]}'
+    return _encode({"task_ids": [task_id]})
+
+
+def stop_task(pool: urllib3.HTTPConnectionPool, task_id: str, errors: List[str]) -> None:
     try:
-        resp = session.post(STOP_URL, json={"task_ids": [task_id]}, timeout=20)
-        if resp.status_code >= 400:
-            errors.append(f"stop failed: HTTP {resp.status_code} {resp.text[:300]}")
+        resp = pool.urlopen("POST", STOP_PATH, body=_stop_body(task_id), headers=JSON_HEADERS, timeout=20)
+        if resp.status >= 400:
+            errors.append(f"stop failed: HTTP {resp.status} {_preview(resp.data)}")
     except Exception as exc:
         errors.append(f"stop exception: {type(exc).__name__}: {exc}")
 
 
-def parse_sse_event(lines: List[str]) -> Optional[Dict[str, Any]]:
-    if not lines:
-        return None
-    data_lines: List[str] = []
-    for line in lines:
-        if line.startswith("data:"):
-            data_lines.append(line[5:].strip())
-    if not data_lines:
-        return None
-    raw = "\n".join(data_lines)
-    if raw == "[DONE]":
+@contextlib.contextmanager
+def open_sse(pool: urllib3.HTTPConnectionPool, task_id: str) -> Iterator[urllib3.BaseHTTPResponse]:
+    path = f"{SSE_PATH}?{urllib.parse.urlencode({'task_id': task_id})}"
+    resp = pool.urlopen("GET", path, headers=ACCEPT_HEADERS, preload_content=False, timeout=SSE_TIMEOUT)
+    try:
+        yield resp
+    finally:
+        # The reader usually leaves before the stream's final chunk, so the socket cannot be
+        # reused: close it, then hand the slot back to the pool.
+        resp.close()
+        resp.release_conn()
+
+
+def iter_events(resp: urllib3.BaseHTTPResponse, chunk_size: int = 65536) -> Iterator[bytes]:
+    # Slice whole events (blank-line separated; the server frames with bare \n) out of each
+    # read, so one Python-level step handles a full event instead of every single line.
+    buf = bytearray()
+    for chunk in resp.stream(chunk_size):
+        buf += chunk
+        start = 0
+        while (end := buf.find(b"\n\n", start)) != -1:
+            yield bytes(buf[start:end])
+            start = end + 2
+        del buf[:start]
+    if buf.strip():
+        yield bytes(buf)
+
+
+def event_data(event: bytes) -> Optional[bytes]:
+    # Common case: the event is a single data: line.
+    if event.startswith(b"data:") and b"\n" not in event:
+        return event[5:].strip()
+    data_lines = [line[5:].strip() for line in event.split(b"\n") if line.startswith(b"data:")]
+    return b"\n".join(data_lines) if data_lines else None
+
+
+def decode_sse_data(raw: bytes) -> Optional[Dict[str, Any]]:
+    if raw == b"[DONE]":
         return None
     try:
-        return json.loads(raw)
+        return _loads(raw)
     except json.JSONDecodeError:
-        return {"type": "error", "message": f"invalid_json:{raw[:200]}"}
+        preview = raw[:200].decode("utf-8", errors="replace")
+        return {"type": "error", "message": f"invalid_json:{preview}"}
+
+
+# Status-event handlers: each records its fields, publishes the transition in a single
+# critical section and wakes run_case. Returning True ends the SSE read loop.
+def _on_running(
+    payload: Dict[str, Any], result: CaseResult, shared: SharedState, done_event: threading.Event
+) -> bool:
+    with shared.cv:
+        shared.running_seen = True
+        shared.cv.notify_all()
+    return False
+
+
+def _on_round_done(
+    payload: Dict[str, Any], result: CaseResult, shared: SharedState, done_event: threading.Event
+) -> bool:
+    n = payload.get("request_n")
+    if isinstance(n, int):
+        result.request_ns.append(n)
+    gc = payload.get("generated_count")
+    if isinstance(gc, int):
+        result.generated_count = gc
+    with shared.cv:
+        shared.round_done_seen += 1
+        shared.cv.notify_all()
+    return False
+
+
+def _on_stopped(
+    payload: Dict[str, Any], result: CaseResult, shared: SharedState, done_event: threading.Event
+) -> bool:
+    reason = payload.get("reason")
+    if reason is not None:
+        result.reason = str(reason)
+    gc = payload.get("generated_count")
+    if isinstance(gc, int):
+        result.generated_count = gc
+    result.status = "ok"
+    with shared.cv:
+        shared.stopped_seen = True
+        done_event.set()
+        shared.cv.notify_all()
+    return True
+
+
+_STATUS_HANDLERS = {
+    "running": _on_running,
+    "round_done": _on_round_done,
+    "stopped": _on_stopped,
+}
 
 
 def run_case(
-    session: requests.Session,
+    pool: urllib3.HTTPConnectionPool,
     case_name: str,
     prompt: str,
     concurrent: int,
@@ -82,14 +225,16 @@ def run_case(
 
     try:
         task_id = create_task(
-            session,
-            {
-                "prompt": prompt,
-                "aspect_ratio": "2:3",
-                "nsfw": False,
-                "quantity": quantity,
-                "concurrent": concurrent,
-            },
+            pool,
+            _encode(
+                {
+                    "prompt": prompt,
+                    "aspect_ratio": "2:3",
+                    "nsfw": False,
+                    "quantity": quantity,
+                    "concurrent": concurrent,
+                }
+            ),
         )
         result.task_id = task_id
     except Exception as exc:
@@ -99,99 +244,103 @@ def run_case(
 
     done_event = threading.Event()
 
+    def finish() -> None:
+        done_event.set()
+        with shared.cv:
+            shared.cv.notify_all()
+
     def reader() -> None:
         try:
-            with session.get(SSE_URL, params={"task_id": result.task_id}, stream=True, timeout=(10, 120)) as resp:
-                if resp.status_code >= 400:
-                    result.errors.append(f"sse http {resp.status_code}: {resp.text[:300]}")
+            with open_sse(pool, result.task_id) as resp:
+                if resp.status >= 400:
+                    result.errors.append(f"sse http {resp.status}: {_preview(resp.read())}")
                     result.status = "failed"
-                    done_event.set()
+                    finish()
                     return
 
-                event_lines: List[str] = []
-                for raw_line in resp.iter_lines(decode_unicode=True):
-                    if raw_line is None:
+                # Per-event callables are bound to locals once to skip repeated global/attribute lookups.
+                handler_for = _STATUS_HANDLERS.get
+                add_error = result.errors.append
+                decode = decode_sse_data
+                for event in iter_events(resp):
+                    raw = event_data(event)
+                    if raw is None:
+                        continue
+                    payload = decode(raw)
+                    if not payload:
                         continue
-                    line = str(raw_line)
-                    if line == "":
-                        payload = parse_sse_event(event_lines)
-                        event_lines = []
-                        if not payload:
-                            continue
-
-                        if payload.get("type") == "error":
-                            result.errors.append(str(payload.get("message") or "unknown_error"))
-
-                        if payload.get("status") == "running":
-                            with shared.lock:
-                                shared.running_seen = True
-
-                        if payload.get("status") == "round_done":
-                            n = payload.get("request_n")
-                            if isinstance(n, int):
-                                result.request_ns.append(n)
-                            gc = payload.get("generated_count")
-                            if isinstance(gc, int):
-                                result.generated_count = gc
-                            with shared.lock:
-                                shared.round_done_seen += 1
-
-                        if payload.get("status") == "stopped":
-                            reason = payload.get("reason")
-                            if reason is not None:
-                                result.reason = str(reason)
-                            gc = payload.get("generated_count")
-                            if isinstance(gc, int):
-                                result.generated_count = gc
-                            with shared.lock:
-                                shared.stopped_seen = True
-                            result.status = "ok"
-                            done_event.set()
-                            return
-                    else:
-                        event_lines.append(line)
+
+                    payload_get = payload.get
+                    if payload_get("type") == "error":
+                        add_error(str(payload_get("message") or "unknown_error"))
+
+                    handler = handler_for(payload_get("status"))
+                    if handler is not None and handler(payload, result, shared, done_event):
+                        return
         except Exception as exc:
             result.errors.append(f"sse exception: {type(exc).__name__}: {exc}")
             if result.status == "pending":
                 result.status = "failed"
-            done_event.set()
+            finish()
 
     t = threading.Thread(target=reader, daemon=True)
     t.start()
 
-    start_at = time.time()
+    start_at = time.monotonic()
+    timeout_deadline = start_at + MAX_WAIT_SECONDS
+    stop_lock = threading.Lock()
     stop_sent = False
-    manual_deadline: Optional[float] = None
+    stop_timer: Optional[threading.Timer] = None
+
+    def send_stop() -> None:
+        # Fires at most once, whether from this thread or from stop_timer.
+        nonlocal stop_sent
+        with stop_lock:
+            if stop_sent:
+                return
+            stop_sent = True
+        if result.task_id:
+            stop_task(pool, result.task_id, result.errors)
+
+    def should_wake() -> bool:
+        # Called with shared.lock held by Condition.wait_for.
+        if done_event.is_set():
+            return True
+        if manual_stop_mode == "after_first_round":
+            return not stop_sent and shared.round_done_seen >= 1
+        if manual_stop_mode == "after_running_delay":
+            return stop_timer is None and shared.running_seen
+        return False
 
     while True:
-        if done_event.wait(timeout=0.2):
+        with shared.cv:
+            shared.cv.wait_for(should_wake, timeout=max(0.0, timeout_deadline - time.monotonic()))
+
+        if done_event.is_set():
             break
 
-        elapsed = time.time() - start_at
-        if elapsed > MAX_WAIT_SECONDS:
+        if time.monotonic() >= timeout_deadline:
+            if stop_timer is not None:
+                # Settle the timed stop first so only this thread touches result.errors below.
+                stop_timer.cancel()
+                stop_timer.join()
             result.status = "timeout"
             result.errors.append(f"timeout after {MAX_WAIT_SECONDS}s")
-            if result.task_id:
-                stop_task(session, result.task_id, result.errors)
+            send_stop()
             break
 
-        if manual_stop_mode:
-            with shared.lock:
-                running_seen = shared.running_seen
-                round_done_seen = shared.round_done_seen
-
-            if manual_stop_mode == "after_first_round" and round_done_seen >= 1 and not stop_sent:
-                if result.task_id:
-                    stop_task(session, result.task_id, result.errors)
-                stop_sent = True
+        if manual_stop_mode == "after_first_round":
+            send_stop()
+        elif manual_stop_mode == "after_running_delay" and stop_timer is None:
+            # One-shot stop 4s after the task is first seen running.
+            stop_timer = threading.Timer(4.0, send_stop)
+            stop_timer.daemon = True
+            stop_timer.start()
 
-            if manual_stop_mode == "after_running_delay":
-                if running_seen and manual_deadline is None:
-                    manual_deadline = time.time() + 4.0
-                if manual_deadline is not None and time.time() >= manual_deadline and not stop_sent:
-                    if result.task_id:
-                        stop_task(session, result.task_id, result.errors)
-                    stop_sent = True
+    if stop_timer is not None:
+        # Drop a pending stop, or wait for one in flight, so it never writes errors after we return.
+        stop_timer.cancel()
+        stop_timer.join()
 
     t.join(timeout=2)
     if result.status == "pending":
@@ -199,10 +348,19 @@ def run_case(
     return result
 
 
-def main() -> None:
-    session = requests.Session()
-    session.headers.update({"Accept": "application/json"})
+def _to_dict(result: CaseResult) -> Dict[str, Any]:
+    return {
+        "case": result.case,
+        "status": result.status,
+        "task_id": result.task_id,
+        "request_ns": result.request_ns,
+        "reason": result.reason,
+        "generated_count": result.generated_count,
+        "errors": result.errors,
+    }
+
 
+def main() -> None:
     cases = [
         {
             "case_name": "case_a_3_1",
@@ -236,28 +394,14 @@ def main() -> None:
 
     summary: Dict[str, Any] = {"base_url": BASE_URL, "results": []}
 
-    for item in cases:
-        result = run_case(
-            session=session,
-            case_name=item["case_name"],
-            prompt=item["prompt"],
-            concurrent=item["concurrent"],
-            quantity=item["quantity"],
-            manual_stop_mode=item["manual_stop_mode"],
-        )
-        summary["results"].append(
-            {
-                "case": result.case,
-                "status": result.status,
-                "task_id": result.task_id,
-                "request_ns": result.request_ns,
-                "reason": result.reason,
-                "generated_count": result.generated_count,
-                "errors": result.errors,
-            }
-        )
+    # The cases are independent workflows; run them side by side on the shared connection pool.
+    with contextlib.closing(build_pool()) as pool:
+        with ThreadPoolExecutor(max_workers=len(cases)) as executor:
+            futures = [executor.submit(run_case, pool=pool, **item) for item in cases]
+            # Collect in submission order so the report lists cases as declared.
+            summary["results"].extend(_to_dict(future.result()) for future in futures)
 
-    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(_dumps(summary))
 
 
 if __name__ == "__main__":
@@ -1,21 +1,37 @@
 import json
+import threading
 import time
 from typing import Any, Dict, List, Optional
 
+try:
+    import orjson
+
+    _loads = orjson.loads
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
 try:
     import requests  # type: ignore
 except Exception:
-    # Minimal requests-compatible shim using urllib for offline environments.
+    # Minimal requests-compatible shim on persistent http.client connections for offline environments.
+    import http.client
+    import io
     import urllib.parse
-    import urllib.request
-    import urllib.error
 
     class _Resp:
-        def __init__(self, raw, status_code: int, url: str):
+        def __init__(self, raw, status_code: int, url: str, on_close=None):
             self._raw = raw
             self.status_code = status_code
             self.url = url
             self._text_cache = None
+            self._on_close = on_close
 
         @property
         def text(self) -> str:
@@ -31,7 +47,7 @@ except Exception:
             if self.status_code >= 400:
                 raise RuntimeError(f"HTTP {self.status_code}: {self.url} {self.text[:500]}")
 
-        def iter_lines(self, decode_unicode=True):
+        def iter_lines(self, decode_unicode=True, chunk_size=512):
             while True:
                 line = self._raw.readline()
                 if not line:
@@ -45,39 +61,87 @@ except Exception:
             return self
 
         def __exit__(self, exc_type, exc, tb):
-            try:
-                self._raw.close()
-            except Exception:
-                pass
+            if self._on_close is not None:
+                self._on_close(self._raw)
 
     class _RequestsShim:
+        """Reuses one keep-alive connection for control POSTs and one for the SSE stream."""
+
+        def __init__(self) -> None:
+            self._control: Optional[http.client.HTTPConnection] = None
+            self._stream: Optional[http.client.HTTPConnection] = None
+            self._lock = threading.Lock()
+
+        @staticmethod
+        def _target(url: str):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path = f"{path}?{parts.query}"
+            return parts.hostname, parts.port, path
+
+        @staticmethod
+        def _open(conn, host, port, timeout):
+            if conn is None or (conn.host, conn.port) != (host, port):
+                if conn is not None:
+                    conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=timeout)
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn
+
         @staticmethod
-        def post(url: str, json: Optional[dict] = None, timeout: int = 30):
+        def _send(conn, method, path, body, headers):
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return conn.getresponse()
+            except (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest):
+                # The server may have dropped an idle keep-alive socket; retry once on a fresh one.
+                conn.close()
+                conn.request(method, path, body=body, headers=headers)
+                return conn.getresponse()
+
+        def post(self, url: str, json: Optional[dict] = None, timeout: int = 30):
+            host, port, path = self._target(url)
             data = None
-            headers = {}
+            headers = {"Connection": "keep-alive"}
             if json is not None:
                 data = str.encode(__import__("json").dumps(json))
                 headers["Content-Type"] = "application/json"
-            req = urllib.request.Request(url, data=data, method="POST", headers=headers)
-            try:
-                raw = urllib.request.urlopen(req, timeout=timeout)
-                return _Resp(raw, getattr(raw, "status", 200), url)
-            except urllib.error.HTTPError as e:
-                return _Resp(e, e.code, url)
-
-        @staticmethod
-        def get(url: str, params: Optional[dict] = None, stream: bool = False, timeout=30):
+            with self._lock:
+                self._control = conn = self._open(self._control, host, port, timeout)
+                try:
+                    resp = self._send(conn, "POST", path, data, headers)
+                    body = resp.read()
+                except Exception:
+                    conn.close()
+                    raise
+                if resp.will_close:
+                    conn.close()
+            return _Resp(io.BytesIO(body), resp.status, url)
+
+        def get(self, url: str, params: Optional[dict] = None, stream: bool = False, timeout=30):
             if params:
                 qs = urllib.parse.urlencode(params)
                 joiner = "&" if "?" in url else "?"
                 url = f"{url}{joiner}{qs}"
+            host, port, path = self._target(url)
             real_timeout = timeout[1] if isinstance(timeout, tuple) else timeout
-            req = urllib.request.Request(url, method="GET")
+            # The stream holds its socket while being read, so it gets its own connection.
+            self._stream = conn = self._open(self._stream, host, port, real_timeout)
             try:
-                raw = urllib.request.urlopen(req, timeout=real_timeout)
-                return _Resp(raw, getattr(raw, "status", 200), url)
-            except urllib.error.HTTPError as e:
-                return _Resp(e, e.code, url)
+                resp = self._send(conn, "GET", path, None, {"Connection": "keep-alive"})
+            except Exception:
+                conn.close()
+                raise
+
+            def release(raw) -> None:
+                # Only a fully drained keep-alive response leaves the socket reusable.
+                if not raw.isclosed() or raw.will_close:
+                    conn.close()
+
+            return _Resp(resp, resp.status, url, on_close=release)
 
     requests = _RequestsShim()  # type: ignore
 
@@ -118,15 +182,6 @@ def stop_task(task_id: str) -> Dict[str, Any]:
     return safe_json(r)
 
 
-def parse_sse_data_line(line: str) -> Dict[str, Any]:
-    if not line.startswith("data:"):
-        raise ValueError(f"non-data-line: {line}")
-    raw = line[5:].strip()
-    if not raw:
-        raise ValueError("empty-data")
-    return json.loads(raw)
-
-
 def run_case(case_name: str, quantity: int, concurrent: int, manual_stop_mode: Optional[str] = None) -> Dict[str, Any]:
     result: Dict[str, Any] = {
         "case": case_name,
@@ -155,6 +210,31 @@ def run_case(case_name: str, quantity: int, concurrent: int, manual_stop_mode: O
 
     stopped = False
     stop_sent = False
+    stop_lock = threading.Lock()
+
+    def send_stop_once(label: str) -> None:
+        # Every stop path (first event, timer thread, late stop) goes through here; send only one.
+        nonlocal stop_sent
+        with stop_lock:
+            if stop_sent:
+                return
+            stop_sent = True
+        try:
+            stop_task(task_id)
+        except Exception as se:
+            result["errors"].append(f"{label}: {se}")
+
+    stop_on_event = manual_stop_mode == "first_event"
+    stop_timer: Optional[threading.Timer] = None
+    if manual_stop_mode == "after_5s":
+        # One-shot stop 5s after the case started, independent of SSE traffic.
+        stop_timer = threading.Timer(
+            max(0.0, 5.0 - (time.monotonic() - start_ts)),
+            send_stop_once,
+            args=("stop_exception",),
+        )
+        stop_timer.daemon = True
+        stop_timer.start()
 
     sse_url = f"{BASE_URL}/v1/public/imagine/sse"
     params = {"task_id": task_id}
@@ -162,24 +242,27 @@ def run_case(case_name: str, quantity: int, concurrent: int, manual_stop_mode: O
     try:
         with requests.get(sse_url, params=params, stream=True, timeout=(10, 125)) as resp:
             resp.raise_for_status()
-            for raw_line in resp.iter_lines(decode_unicode=True):
+            # Lines stay bytes and the data: payload is sliced once (orjson takes bytes directly).
+            for line in resp.iter_lines(decode_unicode=False, chunk_size=16384):
+                if not line or not line.startswith(b"data:"):
+                    continue
+                payload = line[5:]
+                if payload[:1] == b" ":
+                    payload = payload[1:]
+                if not payload or payload == b"[DONE]":
+                    continue
+
+                # Read the clock once per data event; blank separators and comments skip it.
                 now = time.monotonic()
                 if now > deadline:
                     result["errors"].append("timeout: exceeded 120s")
                     break
 
-                if raw_line is None:
-                    continue
-                line = raw_line.strip()
-                if not line:
-                    continue
-                if not line.startswith("data:"):
-                    continue
-
                 try:
-                    evt = parse_sse_data_line(line)
+                    evt = _loads(payload)
                 except Exception as pe:
-                    result["errors"].append(f"sse_parse_exception: {pe}; line={line}")
+                    text = line.decode("utf-8", errors="replace")
+                    result["errors"].append(f"sse_parse_exception: {pe}; line={text}")
                     continue
 
                 status = evt.get("status")
@@ -188,28 +271,13 @@ def run_case(case_name: str, quantity: int, concurrent: int, manual_stop_mode: O
                     rn = evt.get("request_n")
                     if rn is not None:
                         result["request_ns"].append(rn)
-                    if manual_stop_mode == "first_event" and not stop_sent:
-                        try:
-                            stop_task(task_id)
-                            stop_sent = True
-                        except Exception as se:
-                            result["errors"].append(f"stop_exception: {se}")
-
-                if status == "image":
+                    if stop_on_event:
+                        send_stop_once("stop_exception")
+
+                elif status == "image":
                     result["image_events"] += 1
-                    if manual_stop_mode == "first_event" and not stop_sent:
-                        try:
-                            stop_task(task_id)
-                            stop_sent = True
-                        except Exception as se:
-                            result["errors"].append(f"stop_exception: {se}")
-
-                if manual_stop_mode == "after_5s" and not stop_sent and (now - start_ts) >= 5.0:
-                    try:
-                        stop_task(task_id)
-                        stop_sent = True
-                    except Exception as se:
-                        result["errors"].append(f"stop_exception: {se}")
+                    if stop_on_event:
+                        send_stop_once("stop_exception")
 
                 if status == "stopped":
                     result["reason"] = evt.get("reason")
@@ -217,15 +285,16 @@ def run_case(case_name: str, quantity: int, concurrent: int, manual_stop_mode: O
                     stopped = True
                     break
 
-            if not stopped and manual_stop_mode == "after_5s" and not stop_sent and time.monotonic() <= deadline:
-                try:
-                    stop_task(task_id)
-                    stop_sent = True
-                except Exception as se:
-                    result["errors"].append(f"late_stop_exception: {se}")
+            if not stopped and manual_stop_mode == "after_5s" and time.monotonic() <= deadline:
+                send_stop_once("late_stop_exception")
 
     except Exception as e:
         result["errors"].append(f"sse_exception: {e}")
+    finally:
+        if stop_timer is not None:
+            # Drop a pending stop, or wait for one in flight, before the result is finalized.
+            stop_timer.cancel()
+            stop_timer.join()
 
     result["elapsed_sec"] = round(time.monotonic() - start_ts, 3)
     result["status"] = "ok" if stopped and not result["errors"] else ("stopped_with_errors" if stopped else "failed")
@@ -244,7 +313,7 @@ def main() -> None:
     for name, q, c, mode in cases:
         outputs.append(run_case(name, q, c, mode))
 
-    print(json.dumps(outputs, ensure_ascii=False, indent=2))
+    print(_dumps(outputs))
 
 
 if __name__ == "__main__":